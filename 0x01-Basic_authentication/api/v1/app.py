@@ -3,6 +3,7 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.auth import PathMatcher
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -25,6 +26,14 @@ if auth is not None:
         auth = BasicAuth()
 
 
+# paths that don't require authentication, compiled once
+excluded_paths = PathMatcher([
+    '/api/v1/stat*',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/'
+])
+
+
 @app.before_request
 def check_auth_required() -> None:
     """
@@ -35,19 +44,14 @@ def check_auth_required() -> None:
         - if the `Authorization` header string is not valid,
             a `403 Forbidden` error is returned.
     """
-    excluded_paths = [
-        '/api/v1/stat*',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/'
-    ]
-
     if auth:
         # check if the request path requires authentication
         if auth.require_auth(request.path, excluded_paths):
             # check if the `Authorization` header has a value
             if auth.authorization_header(request) is None:
                 abort(401)
-            if auth.current_user(request) is None:
+            # the user is resolved once, for the whole request
+            if auth.request_user(request) is None:
                 abort(403)
 
 
@@ -2,9 +2,46 @@
 """
 Authentication module
 """
-from flask import request
+from flask import g, has_app_context, request
+from functools import lru_cache
 import re
-from typing import List, TypeVar, Union
+from typing import List, Tuple, TypeVar, Union
+
+
+class PathMatcher:
+    """
+    Matches paths against a list of excluded paths (regular expression
+    strings), compiled once into a single alternation
+    """
+
+    def __init__(self, excluded_paths: List[str]):
+        """Instantiation method"""
+        self.excluded_paths = list(excluded_paths)
+        self._regex = None
+        if len(self.excluded_paths) > 0:
+            self._regex = re.compile('|'.join(
+                '(?:{})'.format(ex_path) for ex_path in self.excluded_paths))
+
+    def requires_auth(self, path: str) -> bool:
+        """
+        Returns True if the `path` matches none of the excluded paths
+        """
+        if path is None or self._regex is None:
+            return True
+
+        # check path string for `/`
+        if not path.endswith('/'):
+            path = path + '/'
+
+        return self._regex.match(path) is None
+
+
+@lru_cache(maxsize=32)
+def _path_matcher(excluded_paths: Tuple[str, ...]) -> PathMatcher:
+    """
+    Returns the matcher of a list of excluded paths, compiled once
+    """
+    return PathMatcher(list(excluded_paths))
 
 
 class Auth:
@@ -12,31 +49,27 @@ class Auth:
     Authentication class
     """
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]
+                     ) -> bool:
         """
         Returns a boolean value for a path.\n
         `excluded_paths` can contain a regular expression string
         `/api/v1/stat*`
             - The routes `/api/v1/status/` and `/api/v1/stats` will match\n
+        `excluded_paths` can also be a `PathMatcher` built beforehand.\n
         Return:
           - True if the `path` is not in `excluded_paths`; requires auth
           - False if the `path` is in `excluded_paths`; no auth required
         """
         if path is None:
             return True
-        if excluded_paths is None or len(excluded_paths) == 0:
+        if excluded_paths is None:
             return True
+        if isinstance(excluded_paths, PathMatcher):
+            return excluded_paths.requires_auth(path)
 
-        # check path string for `/`
-        if path[-1] != '/':
-            path = path + '/'
-
-        # check for pattern match of path
-        for ex_path in excluded_paths:
-            if re.match(ex_path, path):
-                return False
-
-        return True
+        return _path_matcher(tuple(excluded_paths)).requires_auth(path)
 
     def authorization_header(self,
                              request=None
@@ -58,3 +91,17 @@ class Auth:
         Returns a current user
         """
         return None
+
+    def request_user(self,
+                     request=None
+                     ) -> Union[None, TypeVar('User')]:
+        """
+        Returns the current user of the request, resolved once per request
+        by `current_user`: the result is kept on `flask.g`
+        """
+        if request is None or not has_app_context():
+            return self.current_user(request)
+
+        if 'auth_user' not in g:
+            g.auth_user = self.current_user(request)
+        return g.auth_user
@@ -2,19 +2,97 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request, Response
+from flask import abort, current_app, jsonify, request, Response
 from models.user import User
-from typing import Tuple, Union
+import json
+from typing import Iterator, Tuple, Union
+
+
+# number of users in each chunk of a streamed list
+STREAM_CHUNK_SIZE = 100
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> Response:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: number of users of the page, in the order of their ids
+      - cursor: id of the last user of the previous page
+      - fields: attributes to return, separated by commas (`id,email`)
+      - stream: `1` to send the list in chunks
     Return:
       - list of all User objects JSON represented
+      - `X-Next-Cursor` header with the cursor of the next page
+      - 400 if a query parameter is not valid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    fields = request.args.get('fields')
+    stream = request.args.get('stream') == '1'
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+    if fields is not None:
+        fields = fields.split(',')
+        for field in fields:
+            if field not in User.json_attributes():
+                error_msg = "unknown field {}".format(field)
+                return jsonify({'error': error_msg}), 400
+
+    if limit is None and stream:
+        # fetched chunk by chunk
+        users = None
+    elif limit is None:
+        users = User.all()
+    else:
+        users = User.page(limit, cursor)
+
+    def to_json_str(user: User) -> str:
+        """ JSON string of a user, restricted to `fields`. A streamed
+        export doesn't cache the JSON strings of the users
+        """
+        if fields is None:
+            # cached on the user
+            return user.to_json_str(cache=not stream)
+        user_json = user.to_json()
+        return json.dumps({field: user_json[field] for field in fields},
+                          sort_keys=True, separators=(',', ':'))
+
+    def chunks() -> Iterator[str]:
+        """ JSON list of the users, in chunks of `STREAM_CHUNK_SIZE`.
+        Without a page, only the ids are listed up front and the users of
+        each chunk are fetched when it is sent
+        """
+        yield "["
+        obj_ids = User.ids() if users is None else None
+        count = len(obj_ids) if users is None else len(users)
+        sep = ""
+        for i in range(0, count, STREAM_CHUNK_SIZE):
+            if users is None:
+                chunk = User.get_many(obj_ids[i:i + STREAM_CHUNK_SIZE])
+            else:
+                chunk = users[i:i + STREAM_CHUNK_SIZE]
+            if len(chunk) == 0:
+                continue
+            yield sep + ",".join(map(to_json_str, chunk))
+            sep = ","
+        yield "]\n"
+
+    if stream:
+        resp = current_app.response_class(chunks(),
+                                          mimetype="application/json")
+    else:
+        all_users = ",".join(map(to_json_str, users))
+        resp = current_app.response_class("[{}]\n".format(all_users),
+                                          mimetype="application/json")
+    if limit is not None and len(users) == limit:
+        resp.headers['X-Next-Cursor'] = users[-1].id
+    return resp
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
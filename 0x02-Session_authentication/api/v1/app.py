@@ -3,6 +3,7 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.auth import PathMatcher
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -17,7 +18,10 @@ auth = None or os.getenv('AUTH_TYPE')
 
 # check for auth env variable
 if auth is not None:
-    if auth == 'session_db_auth':
+    if auth == 'signed_session_auth':
+        from api.v1.auth.signed_session_auth import SignedSessionAuth
+        auth = SignedSessionAuth()
+    elif auth == 'session_db_auth':
         from api.v1.auth.session_db_auth import SessionDBAuth
         auth = SessionDBAuth()
     elif auth == 'session_exp_auth':
@@ -34,6 +38,15 @@ if auth is not None:
         auth = BasicAuth()
 
 
+# paths that don't require authentication, compiled once
+excluded_paths = PathMatcher([
+    '/api/v1/stat*',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/'
+])
+
+
 @app.before_request
 def check_auth_required() -> None:
     """
@@ -45,13 +58,6 @@ def check_auth_required() -> None:
         - if the `Authorization` header string is not valid,
             a `403 Forbidden` error is returned.
     """
-    excluded_paths = [
-        '/api/v1/stat*',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/',
-        '/api/v1/auth_session/login/'
-    ]
-
     if auth:
         # check if the request path requires authentication
         if auth.require_auth(request.path, excluded_paths):
@@ -60,9 +66,11 @@ def check_auth_required() -> None:
             if auth.authorization_header(request) is None \
                     and auth.session_cookie(request) is None:
                 abort(401)
-            if auth.current_user(request) is None:
+            # the user is resolved once, for the whole request
+            current_user = auth.request_user(request)
+            if current_user is None:
                 abort(403)
-            request.current_user = auth.current_user(request)
+            request.current_user = current_user
 
 
 @app.errorhandler(404)
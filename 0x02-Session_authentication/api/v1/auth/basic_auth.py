@@ -3,8 +3,12 @@
 Basic Access Authentication module
 """
 from api.v1.auth.auth import Auth
+from api.v1.auth.cache import TTLCache
 import base64
 import binascii
+import hashlib
+import hmac
+import os
 from typing import Tuple, TypeVar, Union
 
 
@@ -13,6 +17,23 @@ class BasicAuth(Auth):
     Implements Basic Access Authentication
     """
 
+    def __init__(self):
+        """Instantiation method"""
+        # cache of verified `Authorization` headers, keyed by their HMAC
+        # with a per-process key: digest -> (`user_id`, password hash).
+        # Sized by `BASIC_AUTH_CACHE_SIZE`, refreshed after
+        # `BASIC_AUTH_CACHE_TTL` seconds
+        try:
+            cache_size = int(os.getenv('BASIC_AUTH_CACHE_SIZE', '10000'))
+        except ValueError:
+            cache_size = 10000
+        try:
+            cache_ttl = int(os.getenv('BASIC_AUTH_CACHE_TTL', '60'))
+        except ValueError:
+            cache_ttl = 60
+        self.credentials_cache = TTLCache(cache_size, cache_ttl)
+        self._cache_key = os.urandom(32)
+
     def extract_base64_authorization_header(
         self,
         authorization_header: Union[None, str]
@@ -26,11 +47,11 @@ class BasicAuth(Auth):
             return None
 
         # Authorization header should be separated by one space
-        if authorization_header.split(' ')[0] != 'Basic' \
-                or authorization_header.split(' ')[1] == '':
+        parts = authorization_header.split(' ')
+        if parts[0] != 'Basic' or len(parts) < 2 or parts[1] == '':
             return None
 
-        return authorization_header.split(' ')[1]
+        return parts[1]
 
     def decode_base64_authorization_header(
             self,
@@ -121,6 +142,14 @@ class BasicAuth(Auth):
         auth_header = self.authorization_header(request)
         if auth_header is None:
             return None
+
+        # header already verified
+        digest = hmac.new(self._cache_key, auth_header.encode('UTF-8'),
+                          hashlib.sha256).digest()
+        user_obj = self.cached_user(digest)
+        if user_obj is not None:
+            return user_obj
+
         # extract the encoded str
         encoded_str = self.extract_base64_authorization_header(auth_header)
         if encoded_str is None:
@@ -137,4 +166,27 @@ class BasicAuth(Auth):
             return None
 
         # returns a user object or None
-        return self.user_object_from_credentials(email, password)
+        user_obj = self.user_object_from_credentials(email, password)
+        if user_obj is not None:
+            self.credentials_cache.set(digest,
+                                       (user_obj.id, user_obj.password))
+        return user_obj
+
+    def cached_user(self, digest: bytes) -> Union[None, TypeVar('User')]:
+        """
+        returns the user of a verified `Authorization` header, from the
+        digest of the header.
+        The entry is dropped if the user was removed or if its password
+        changed since the header was verified
+        """
+        from models.user import User
+
+        cached = self.credentials_cache.get(digest)
+        if cached is None:
+            return None
+        user_id, password = cached
+        user_obj = User.get(user_id)
+        if user_obj is None or user_obj.password != password:
+            self.credentials_cache.delete(digest)
+            return None
+        return user_obj
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+In-process cache module
+"""
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    Bounded cache: entries expire `ttl` seconds after they are set, and
+    the least recently used entry is evicted past `max_size` entries
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        """Instantiation method"""
+        self.max_size = max_size
+        self.ttl = ttl
+        # {key: (expiration time, value)}, least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        returns the value of `key`, `default` if it's missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        sets the value of `key`, evicts the least recently used entry
+        if the cache is full
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        """
+        removes `key` from the cache, returns True if it was cached
+        """
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        """
+        removes all the entries of the cache
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """
+        returns the number of entries, expired ones included
+        """
+        return len(self._entries)
@@ -3,9 +3,12 @@
 Session Authentication module
 """
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import (MemorySessionStore, SessionStore,
+                                       UserIdView, session_store_from_env)
 # import base64
 # import binascii
-from typing import Tuple, TypeVar, Union
+import time
+from typing import Any, Dict, Tuple, TypeVar, Union
 import uuid
 
 
@@ -13,7 +16,26 @@ class SessionAuth(Auth):
     """
     Implements Session Authentication
     """
-    user_id_by_session_id = {}
+    # records of the in-memory sessions: {session_id: record}
+    session_records = {}
+    # `session_id` -> `user_id` view of `session_records`
+    user_id_by_session_id = UserIdView(session_records)
+    # sessions never expire
+    session_duration = 0
+
+    def __init__(self):
+        """Instantiation method"""
+        # the store selected by `SESSION_STORE`, else the default one
+        self.session_store = session_store_from_env(self.session_duration)
+        if self.session_store is None:
+            self.session_store = self.default_session_store()
+
+    def default_session_store(self) -> SessionStore:
+        """
+        returns the store of the sessions when `SESSION_STORE` is not set:
+        `session_records`, in memory
+        """
+        return MemorySessionStore(self.session_records)
 
     def create_session(self, user_id: Union[str, None] = None) -> str:
         """
@@ -24,20 +46,34 @@ class SessionAuth(Auth):
 
         # Generate new session id
         new_session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[new_session_id] = user_id
+        record = {"user_id": user_id, "created_at": time.time()}
+        self.session_store.set(new_session_id, record,
+                               max(self.session_duration, 0))
 
         return new_session_id
 
+    def session_record(self,
+                       session_id: Union[str, None] = None
+                       ) -> Union[Dict[str, Any], None]:
+        """
+        Returns the record of a session from the store
+        """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+
+        return self.session_store.get(session_id)
+
     def user_id_for_session_id(self,
                                session_id: Union[str, None] = None
                                ) -> str:
         """
         Returns a `user_id` based on a `session_id`
         """
-        if session_id is None or not isinstance(session_id, str):
+        record = self.session_record(session_id)
+        if record is None:
             return None
 
-        return self.user_id_by_session_id.get(session_id, None)
+        return record.get('user_id')
 
     def current_user(self, request=None) -> Union[None, TypeVar('User')]:
         """
@@ -74,6 +110,6 @@ class SessionAuth(Auth):
         if self.user_id_for_session_id(user_session_id) is None:
             return False
         # delete session id from storage
-        del self.user_id_by_session_id[user_session_id]
+        self.session_store.delete(user_session_id)
 
         return True
@@ -2,10 +2,11 @@
 """
 Session Database Expiration authentication module
 """
+from api.v1.auth.cache import TTLCache
 from api.v1.auth.session_exp_auth import SessionExpAuth
-from datetime import datetime, timedelta
-from models.user_session import UserSession
-from typing import Union
+from api.v1.auth.session_store import FileSessionStore, SessionStore
+import os
+from typing import Any, Dict, Union
 
 
 class SessionDBAuth(SessionExpAuth):
@@ -16,22 +17,44 @@ class SessionDBAuth(SessionExpAuth):
     def __init__(self):
         """Instantiation method"""
         super().__init__()
+        # cache of `session_id` -> session record, sized by
+        # `SESSION_CACHE_SIZE` and refreshed after `SESSION_CACHE_TTL`.
+        # The cache is per process: a session logged out by another worker
+        # is still accepted here until its entry is refreshed
+        try:
+            cache_size = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+        except ValueError:
+            cache_size = 10000
+        try:
+            cache_ttl = float(os.getenv('SESSION_CACHE_TTL', '5'))
+        except ValueError:
+            cache_ttl = 5
+        self.session_cache = TTLCache(cache_size, cache_ttl)
 
-    def create_session(self,
-                       user_id: Union[str, None] = None
-                       ) -> Union[str, None]:
+    def default_session_store(self) -> SessionStore:
         """
-        Creates a new `UserSession` instance session id
+        returns the store of the sessions when `SESSION_STORE` is not set:
+        `UserSession` instances, in the `database` file
+        """
+        return FileSessionStore(self.session_duration)
+
+    def session_record(self,
+                       session_id: Union[str, None] = None
+                       ) -> Union[Dict[str, Any], None]:
+        """
+        returns the record of a session from the cache, or from the
+        `database` on a miss
         """
-        session_id = super().create_session(user_id)
         if session_id is None:
             return None
-        # create a new UserSession
-        _dict = {"user_id": user_id, "session_id": session_id}
-        user_session = UserSession(**_dict)
-        user_session.save()
+        record = self.session_cache.get(session_id)
+        if record is None:
+            record = super().session_record(session_id)
+            if record is None:
+                return None
+            self.session_cache.set(session_id, record)
 
-        return session_id
+        return record
 
     def user_id_for_session_id(self,
                                session_id: Union[str, None] = None
@@ -40,25 +63,11 @@ class SessionDBAuth(SessionExpAuth):
         returns a `UserSession`'s user_id from the `database` based
         on the `session_id`
         """
-        if session_id is None:
-            return None
-        # define the search
-        _objs = UserSession.search({"session_id": session_id})
-        if len(_objs) == 0:
-            return None
-        user_session_obj = _objs[0]
-
-        # check session duration
-        if self.session_duration <= 0:
-            return user_session_obj.user_id
-
-        # check if the session already expired
-        if user_session_obj.created_at + \
-                timedelta(seconds=self.session_duration) \
-                < datetime.now():
-            return None
-
-        return user_session_obj.user_id
+        user_id = super().user_id_for_session_id(session_id)
+        if user_id is None and session_id is not None:
+            # expired
+            self.session_cache.delete(session_id)
+        return user_id
 
     def destroy_session(self, request=None) -> bool:
         """
@@ -72,12 +81,6 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         if session_id is None:
             return False
-        # get user sessions from database
-        # define the search
-        _objs = UserSession.search({"session_id": session_id})
-        if len(_objs) == 0:
-            return False
+        self.session_cache.delete(session_id)
         # remove all session objects from database
-        for user_session_obj in _objs:
-            user_session_obj.remove()
-        return True
+        return self.session_store.delete(session_id)
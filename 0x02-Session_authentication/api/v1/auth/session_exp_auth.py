@@ -3,9 +3,10 @@
 Session Expiration authentication module
 """
 from api.v1.auth.session_auth import SessionAuth
-from datetime import datetime, timedelta
+from api.v1.auth.session_reaper import SessionReaper
 import os
-from typing import Union
+import time
+from typing import Any, Dict, Union
 
 
 class SessionExpAuth(SessionAuth):
@@ -20,48 +21,108 @@ class SessionExpAuth(SessionAuth):
             self.session_duration = int(session_duration)
         except (ValueError, TypeError):
             self.session_duration = 0
-
-    def create_session(self,
-                       user_id: Union[str, None] = None
-                       ) -> Union[str, None]:
-        """
-        Creates session id
-        """
-        session_id = super().create_session(user_id)
-        if session_id is None:
-            return None
-        # initialize session_id to a dict
-        self.user_id_by_session_id[session_id] = {}
-        # set user_id and current date
-        self.user_id_by_session_id[session_id]['user_id'] = user_id
-        self.user_id_by_session_id[session_id]['created_at'] = datetime.now()
-
-        return session_id
+        super().__init__()
+        # with `SESSION_EXPIRATION=sliding`, sessions expire
+        # `session_duration` seconds after the last request instead of
+        # after their creation. `last_seen` is kept in memory and saved
+        # in the store at most once per `SESSION_TOUCH_INTERVAL` seconds
+        self.session_sliding = os.getenv('SESSION_EXPIRATION') == 'sliding'
+        try:
+            touch_interval = float(os.getenv('SESSION_TOUCH_INTERVAL', '60'))
+        except ValueError:
+            touch_interval = 60
+        # the store must be touched before the session expires there
+        self.session_touch_interval = min(max(touch_interval, 0),
+                                          self.session_duration / 2)
+        # {session_id: (last seen, last saved in the store)}
+        self.session_last_seen = {}
+        # removes the expired sessions every `SESSION_REAP_INTERVAL`
+        # seconds, from the requests or from a thread if `SESSION_REAPER`
+        # is `thread`
+        self.session_reaper = None
+        if self.session_duration > 0:
+            try:
+                interval = float(os.getenv('SESSION_REAP_INTERVAL', '60'))
+            except ValueError:
+                interval = 60
+            self.session_reaper = SessionReaper(
+                self.session_store, max(interval, 1),
+                on_reap=self.forget_expired_sessions)
+            if os.getenv('SESSION_REAPER') == 'thread':
+                self.session_reaper.start()
 
     def user_id_for_session_id(self,
                                session_id: Union[str, None] = None
                                ) -> str:
         """
-        returns a `user_id` from a `session_id` dictionary if the
+        returns a `user_id` from a `session_id` record if the
         session is still valid and not expired:\n
         `created_at + self.session_duration < current_date`.\n
         If the above is true, it means the session is expired.
+        With sliding expiration, `last_seen` replaces `created_at`
         """
         if session_id is None:
             return None
-        session_dict = self.user_id_by_session_id.get(session_id)
-        if session_dict is None:
+        if self.session_reaper is not None:
+            self.session_reaper.maybe_reap()
+        record = self.session_record(session_id)
+        if record is None:
             return None
         # check session duration
         if self.session_duration <= 0:
-            return session_dict.get('user_id')
-        if session_dict.get('created_at', None) is None:
+            return record.get('user_id')
+        if self.session_sliding:
+            return self.slide_session(session_id, record)
+        if record.get('created_at', None) is None:
             return None
 
         # check if the session already expired
-        if session_dict.get('created_at') + \
-                timedelta(seconds=self.session_duration) \
-                < datetime.now():
+        if record.get('created_at') + self.session_duration < time.time():
+            return None
+
+        return record.get('user_id')
+
+    def slide_session(self, session_id: str,
+                      record: Dict[str, Any]) -> Union[str, None]:
+        """
+        returns the `user_id` of a session if it was seen in the last
+        `session_duration` seconds, and renews it.\n
+        The store is only touched if the session was not saved in the last
+        `session_touch_interval` seconds
+        """
+        now = time.time()
+        last_seen, saved = self.session_last_seen.get(session_id, (0, 0))
+        # the store is ahead if another process touched the session
+        stored = record.get('last_seen') or record.get('created_at') or 0
+        saved = max(saved, stored)
+        last_seen = max(last_seen, saved)
+        if last_seen + self.session_duration < now:
+            self.session_last_seen.pop(session_id, None)
             return None
 
-        return session_dict.get('user_id')
+        if now - saved >= self.session_touch_interval:
+            if not self.session_store.touch(session_id):
+                self.session_last_seen.pop(session_id, None)
+                return None
+            saved = now
+        self.session_last_seen[session_id] = (now, saved)
+        return record.get('user_id')
+
+    def forget_expired_sessions(self, now: float) -> None:
+        """
+        drops the expired sessions from `session_last_seen`
+        """
+        expired = [session_id for session_id, (last_seen, _)
+                   in list(self.session_last_seen.items())
+                   if last_seen + self.session_duration < now]
+        for session_id in expired:
+            self.session_last_seen.pop(session_id, None)
+
+    def destroy_session(self, request=None) -> bool:
+        """
+        deletes a session from storage, and its `last_seen`
+        """
+        destroyed = super().destroy_session(request)
+        if destroyed:
+            self.session_last_seen.pop(self.session_cookie(request), None)
+        return destroyed
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Reaper of the expired sessions of a session store.
+
+The stores keep their sessions ordered by expiration time, so a sweep
+only visits the sessions that are actually expired.
+The reaper sweeps either lazily, from the requests, at most once per
+`interval` seconds, or from a background thread every `interval` seconds
+"""
+from api.v1.auth.session_store import SessionStore
+import threading
+import time
+from typing import Callable, Union
+
+
+class SessionReaper:
+    """
+    Removes the expired sessions of a `SessionStore`
+    """
+
+    def __init__(self, store: SessionStore, interval: float = 60,
+                 background: bool = False,
+                 on_reap: Union[Callable[[float], None], None] = None):
+        """Instantiation method.
+        `on_reap` is called with the time of each sweep
+        """
+        self.store = store
+        self.on_reap = on_reap
+        self.interval = interval
+        self.background = background
+        # number of sessions removed since the start, and by the last sweep
+        self.reclaimed = 0
+        self.last_reclaimed = 0
+        self._next_reap = time.monotonic() + interval
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def reap(self) -> int:
+        """
+        removes the expired sessions of the store now, returns how many
+        were removed
+        """
+        with self._lock:
+            self._next_reap = time.monotonic() + self.interval
+            reclaimed = self.store.reap()
+            self.last_reclaimed = reclaimed
+            self.reclaimed += reclaimed
+            if self.on_reap is not None:
+                self.on_reap(time.time())
+        return reclaimed
+
+    def maybe_reap(self) -> int:
+        """
+        removes the expired sessions if the last sweep is older than
+        `interval` seconds and no background thread is sweeping
+        """
+        if self.background or time.monotonic() < self._next_reap:
+            return 0
+        return self.reap()
+
+    def start(self) -> None:
+        """
+        starts the background thread sweeping every `interval` seconds
+        """
+        if self._thread is not None:
+            return
+        self.background = True
+        self._thread = threading.Thread(target=self._run,
+                                        name='session-reaper', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """
+        loop of the background thread
+        """
+        while True:
+            time.sleep(self.interval)
+            self.reap()
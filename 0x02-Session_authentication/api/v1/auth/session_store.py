@@ -0,0 +1,700 @@
+#!/usr/bin/env python3
+"""
+Session store module.
+A session store maps a `session_id` to a session record:
+    {"user_id": str, "created_at": float, "last_seen": float or None}
+(timestamps in seconds since the epoch).
+Sessions can be given a time to live: they expire `ttl` seconds after
+they are set, touched or re-armed with `expire`, and `reap` removes the
+expired sessions
+"""
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from datetime import timezone
+import heapq
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Union
+from urllib.parse import urlparse
+
+
+class SessionStoreError(Exception):
+    """
+    Error returned by a session store backend
+    """
+
+
+class SessionStore(ABC):
+    """
+    Interface of the session stores
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> Union[Dict[str, Any], None]:
+        """
+        returns the record of a session, None if missing or expired
+        """
+
+    @abstractmethod
+    def set(self, session_id: str, record: Dict[str, Any],
+            ttl: float = 0) -> None:
+        """
+        sets the record of a session, expiring after `ttl` seconds
+        (never if `ttl` is 0)
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """
+        deletes a session, returns True if it existed
+        """
+
+    @abstractmethod
+    def touch(self, session_id: str) -> bool:
+        """
+        sets the `last_seen` time of a session to now, and pushes back its
+        expiration by its time to live.
+        Returns False if the session is missing or expired
+        """
+
+    @abstractmethod
+    def expire(self, session_id: str, ttl: float) -> bool:
+        """
+        sets the time to live of a session, from now (0 to persist it).
+        Returns False if the session is missing or expired
+        """
+
+    @abstractmethod
+    def reap(self) -> int:
+        """
+        removes the expired sessions, returns how many were removed
+        """
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Session store in a dictionary of the process
+    """
+
+    def __init__(self, records: Union[Dict[str, Any], None] = None):
+        """Instantiation method"""
+        # {session_id: record}
+        self.records = records if records is not None else {}
+        # {session_id: (expiration time, ttl)}
+        self._expirations = {}
+        # (expiration time, session_id) of the sessions, ordered by time.
+        # Each expiration change pushes an entry, outdated ones are
+        # skipped by `reap`
+        self._expiration_heap = []
+        self._lock = threading.Lock()
+
+    def _set_expiration(self, session_id: str, expires_at: float,
+                        ttl: float) -> None:
+        """
+        sets the expiration of a session
+        """
+        self._expirations[session_id] = (expires_at, ttl)
+        heapq.heappush(self._expiration_heap, (expires_at, session_id))
+
+    def _expired(self, session_id: str, now: float) -> bool:
+        """
+        returns True if the session expired, and drops it
+        """
+        expiration = self._expirations.get(session_id)
+        if expiration is None or expiration[0] >= now:
+            return False
+        self.records.pop(session_id, None)
+        del self._expirations[session_id]
+        return True
+
+    def get(self, session_id: str) -> Union[Dict[str, Any], None]:
+        """
+        returns the record of a session, None if missing or expired
+        """
+        with self._lock:
+            if self._expired(session_id, time.time()):
+                return None
+            record = self.records.get(session_id)
+            return dict(record) if record is not None else None
+
+    def set(self, session_id: str, record: Dict[str, Any],
+            ttl: float = 0) -> None:
+        """
+        sets the record of a session
+        """
+        with self._lock:
+            self.records[session_id] = dict(record)
+            if ttl > 0:
+                self._set_expiration(session_id, time.time() + ttl, ttl)
+            else:
+                self._expirations.pop(session_id, None)
+
+    def delete(self, session_id: str) -> bool:
+        """
+        deletes a session
+        """
+        with self._lock:
+            self._expirations.pop(session_id, None)
+            return self.records.pop(session_id, None) is not None
+
+    def touch(self, session_id: str) -> bool:
+        """
+        updates `last_seen` and the expiration of a session
+        """
+        now = time.time()
+        with self._lock:
+            if self._expired(session_id, now) \
+                    or session_id not in self.records:
+                return False
+            self.records[session_id]['last_seen'] = now
+            expiration = self._expirations.get(session_id)
+            if expiration is not None:
+                self._set_expiration(session_id, now + expiration[1],
+                                     expiration[1])
+            return True
+
+    def expire(self, session_id: str, ttl: float) -> bool:
+        """
+        sets the time to live of a session
+        """
+        now = time.time()
+        with self._lock:
+            if self._expired(session_id, now) \
+                    or session_id not in self.records:
+                return False
+            if ttl > 0:
+                self._set_expiration(session_id, now + ttl, ttl)
+            else:
+                self._expirations.pop(session_id, None)
+            return True
+
+    def reap(self) -> int:
+        """
+        removes the expired sessions, in the order of expiration
+        """
+        now = time.time()
+        reaped = 0
+        with self._lock:
+            heap = self._expiration_heap
+            while len(heap) > 0 and heap[0][0] < now:
+                expires_at, session_id = heapq.heappop(heap)
+                expiration = self._expirations.get(session_id)
+                if expiration is None or expiration[0] != expires_at:
+                    # outdated entry
+                    continue
+                if self._expired(session_id, now):
+                    reaped += 1
+        return reaped
+
+
+class UserIdView(MutableMapping):
+    """
+    View `session_id` -> `user_id` of the records of a `MemorySessionStore`,
+    for the callers of `SessionAuth.user_id_by_session_id`.
+    A `user_id` set through the view is a session without expiration
+    """
+
+    def __init__(self, records: Dict[str, Dict[str, Any]]):
+        """Instantiation method"""
+        self.records = records
+
+    def __getitem__(self, session_id: str) -> str:
+        """
+        returns the `user_id` of a session
+        """
+        return self.records[session_id]["user_id"]
+
+    def __setitem__(self, session_id: str, user_id: str) -> None:
+        """
+        sets the `user_id` of a session
+        """
+        self.records[session_id] = {"user_id": user_id,
+                                    "created_at": time.time()}
+
+    def __delitem__(self, session_id: str) -> None:
+        """
+        deletes a session
+        """
+        del self.records[session_id]
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        iterates over the session ids
+        """
+        return iter(list(self.records))
+
+    def __len__(self) -> int:
+        """
+        returns the number of sessions
+        """
+        return len(self.records)
+
+
+class FileSessionStore(SessionStore):
+    """
+    Session store in the file-backed `UserSession` model
+    (`.db_UserSession.json`)
+    """
+
+    def __init__(self, ttl: float = 0):
+        """Instantiation method.
+        `ttl` is the time to live of the sessions saved without one
+        """
+        from models.base import DATA
+        from models.user_session import UserSession
+
+        if DATA.get(UserSession.__name__) is None:
+            UserSession.load_from_file()
+        self.ttl = ttl
+        # (expiration time, session_id) of the sessions, ordered by time.
+        # Each expiration change pushes an entry, outdated ones are
+        # skipped by `reap`
+        self._expiration_heap = []
+        self._lock = threading.Lock()
+        for user_session in UserSession.all():
+            expires_at = self._expires_at(user_session)
+            if expires_at is not None:
+                self._expiration_heap.append(
+                    (expires_at, user_session.session_id))
+        heapq.heapify(self._expiration_heap)
+
+    def _expires_at(self, user_session: Any) -> Union[float, None]:
+        """
+        returns the expiration time of a `UserSession`
+        """
+        if user_session.expires_at is not None:
+            return user_session.expires_at
+        if self.ttl <= 0:
+            return None
+        created_at = user_session.created_at.replace(tzinfo=timezone.utc)
+        return created_at.timestamp() + self.ttl
+
+    def _push_expiration(self, user_session: Any) -> None:
+        """
+        records the expiration time of a `UserSession`
+        """
+        expires_at = self._expires_at(user_session)
+        if expires_at is not None:
+            with self._lock:
+                heapq.heappush(self._expiration_heap,
+                               (expires_at, user_session.session_id))
+
+    @staticmethod
+    def _user_sessions(session_id: str) -> List[Any]:
+        """
+        returns the `UserSession` instances of a session
+        """
+        from models.user_session import UserSession
+
+        if session_id is None:
+            return []
+        return UserSession.search({"session_id": session_id})
+
+    def _live_session(self, session_id: str) -> Any:
+        """
+        returns the `UserSession` of a session, None if missing or expired
+        """
+        user_sessions = self._user_sessions(session_id)
+        if len(user_sessions) == 0:
+            return None
+        user_session = user_sessions[0]
+        if user_session.expires_at is not None \
+                and user_session.expires_at < time.time():
+            return None
+        return user_session
+
+    def get(self, session_id: str) -> Union[Dict[str, Any], None]:
+        """
+        returns the record of a session, None if missing or expired
+        """
+        user_session = self._live_session(session_id)
+        if user_session is None:
+            return None
+        # `created_at` of the models is a naive UTC datetime
+        created_at = user_session.created_at.replace(tzinfo=timezone.utc)
+        return {
+            "user_id": user_session.user_id,
+            "created_at": created_at.timestamp(),
+            "last_seen": user_session.last_seen
+        }
+
+    def set(self, session_id: str, record: Dict[str, Any],
+            ttl: float = 0) -> None:
+        """
+        sets the record of a session
+        """
+        from models.user_session import UserSession
+
+        for user_session in self._user_sessions(session_id):
+            user_session.remove()
+        # `created_at` is the creation time of the `UserSession`
+        user_session = UserSession(
+            user_id=record.get("user_id"),
+            session_id=session_id,
+            last_seen=record.get("last_seen"),
+            ttl=ttl if ttl > 0 else None,
+            expires_at=time.time() + ttl if ttl > 0 else None)
+        user_session.save()
+        self._push_expiration(user_session)
+
+    def delete(self, session_id: str) -> bool:
+        """
+        deletes a session
+        """
+        user_sessions = self._user_sessions(session_id)
+        for user_session in user_sessions:
+            user_session.remove()
+        return len(user_sessions) > 0
+
+    def touch(self, session_id: str) -> bool:
+        """
+        updates `last_seen` and the expiration of a session
+        """
+        user_session = self._live_session(session_id)
+        if user_session is None:
+            return False
+        user_session.last_seen = time.time()
+        if user_session.ttl is not None:
+            user_session.expires_at = user_session.last_seen + \
+                user_session.ttl
+        # not added back if it was deleted meanwhile (a logout)
+        if not user_session.save_if_stored():
+            return False
+        self._push_expiration(user_session)
+        return True
+
+    def expire(self, session_id: str, ttl: float) -> bool:
+        """
+        sets the time to live of a session
+        """
+        user_session = self._live_session(session_id)
+        if user_session is None:
+            return False
+        user_session.ttl = ttl if ttl > 0 else None
+        user_session.expires_at = time.time() + ttl if ttl > 0 else None
+        # not added back if it was deleted meanwhile (a logout)
+        if not user_session.save_if_stored():
+            return False
+        self._push_expiration(user_session)
+        return True
+
+    def reap(self) -> int:
+        """
+        removes the expired sessions, in the order of expiration.
+        They are removed from the file in a single write
+        """
+        from models.user_session import UserSession
+
+        now = time.time()
+        expired = []
+        with self._lock:
+            heap = self._expiration_heap
+            while len(heap) > 0 and heap[0][0] < now:
+                expired.append(heapq.heappop(heap))
+
+        user_sessions = []
+        for expires_at, session_id in expired:
+            for user_session in self._user_sessions(session_id):
+                # outdated entries don't match the expiration time
+                if self._expires_at(user_session) == expires_at:
+                    user_sessions.append(user_session)
+        return UserSession.remove_many(user_sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in a SQLite database, in WAL mode so that the workers
+    sharing the database don't block each other's reads
+    """
+
+    def __init__(self, db_path: str = '.db_sessions.sqlite'):
+        """Instantiation method"""
+        self.db_path = db_path
+        # one connection per thread
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                created_at REAL,
+                last_seen REAL,
+                ttl REAL,
+                expires_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_expires_at
+                ON sessions (expires_at);
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        returns the connection of the current thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # autocommit: every statement is its own transaction
+            conn = sqlite3.connect(self.db_path, timeout=10,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Union[Dict[str, Any], None]:
+        """
+        returns the record of a session, None if missing or expired
+        """
+        row = self._connection().execute(
+            "SELECT user_id, created_at, last_seen FROM sessions "
+            "WHERE session_id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (session_id, time.time())).fetchone()
+        if row is None:
+            return None
+        return {"user_id": row[0], "created_at": row[1], "last_seen": row[2]}
+
+    def set(self, session_id: str, record: Dict[str, Any],
+            ttl: float = 0) -> None:
+        """
+        sets the record of a session
+        """
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, record.get("user_id"),
+             record.get("created_at", now), record.get("last_seen"),
+             ttl if ttl > 0 else None, now + ttl if ttl > 0 else None))
+
+    def delete(self, session_id: str) -> bool:
+        """
+        deletes a session
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def touch(self, session_id: str) -> bool:
+        """
+        updates `last_seen` and the expiration of a session
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE sessions SET last_seen = ?, expires_at = ? + ttl "
+            "WHERE session_id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (now, now, session_id, now))
+        return cursor.rowcount > 0
+
+    def expire(self, session_id: str, ttl: float) -> bool:
+        """
+        sets the time to live of a session
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE sessions SET ttl = ?, expires_at = ? "
+            "WHERE session_id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (ttl if ttl > 0 else None, now + ttl if ttl > 0 else None,
+             session_id, now))
+        return cursor.rowcount > 0
+
+    def reap(self) -> int:
+        """
+        removes the expired sessions, through the index on `expires_at`
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+        return cursor.rowcount
+
+
+class RespSessionStore(SessionStore):
+    """
+    Session store in a server speaking the Redis protocol (RESP), such as
+    Redis, KeyDB or Valkey. The server expires the sessions itself.
+    Each session is a key `session:<session_id>` holding the JSON record
+    and its time to live
+    """
+
+    def __init__(self, url: str = 'redis://127.0.0.1:6379/0'):
+        """Instantiation method"""
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        # one connection per thread
+        self._local = threading.local()
+
+    def _connect(self) -> None:
+        """
+        opens the connection of the current thread
+        """
+        sock = socket.create_connection((self.host, self.port), timeout=5)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password is not None:
+            self._send('AUTH', self.password)
+        if self.db != 0:
+            self._send('SELECT', self.db)
+
+    def _close(self) -> None:
+        """
+        closes the connection of the current thread
+        """
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                self._local.reader.close()
+                sock.close()
+            except OSError:
+                pass
+
+    def _send(self, *args: Any) -> Any:
+        """
+        sends a command on the connection and returns the reply
+        """
+        parts = [str(arg).encode('utf-8') for arg in args]
+        payload = b'*%d\r\n' % len(parts) + b''.join(
+            b'$%d\r\n%s\r\n' % (len(part), part) for part in parts)
+        self._local.sock.sendall(payload)
+        return self._read_reply()
+
+    def _read_reply(self) -> Any:
+        """
+        reads and decodes a reply of the server
+        """
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by the server")
+        kind, value = line[:1], line[1:-2]
+        if kind == b'+':
+            return value.decode('utf-8')
+        if kind == b'-':
+            raise SessionStoreError(value.decode('utf-8'))
+        if kind == b':':
+            return int(value)
+        if kind == b'$':
+            if int(value) < 0:
+                return None
+            return self._local.reader.read(int(value) + 2)[:-2]
+        if kind == b'*':
+            if int(value) < 0:
+                return None
+            return [self._read_reply() for _ in range(int(value))]
+        raise SessionStoreError("invalid reply {!r}".format(line))
+
+    def command(self, *args: Any) -> Any:
+        """
+        runs a command, reconnecting once if the connection was lost
+        """
+        for attempt in range(2):
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            try:
+                return self._send(*args)
+            except (ConnectionError, socket.timeout, OSError):
+                self._close()
+                if attempt == 1:
+                    raise
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        """
+        returns the key of a session
+        """
+        return 'session:{}'.format(session_id)
+
+    def _set(self, session_id: str, value: Dict[str, Any],
+             ttl: float, exists: bool = False) -> bool:
+        """
+        sets the value of a session key. With `exists`, only if the key is
+        still set (`XX`): a session deleted meanwhile is not recreated.
+        Returns False if the key wasn't set
+        """
+        args = ['SET', self._key(session_id), json.dumps(value)]
+        if ttl > 0:
+            args += ['PX', int(ttl * 1000)]
+        if exists:
+            args.append('XX')
+        return self.command(*args) is not None
+
+    def _get(self, session_id: str) -> Union[Dict[str, Any], None]:
+        """
+        returns the value of a session key
+        """
+        value = self.command('GET', self._key(session_id))
+        return json.loads(value) if value is not None else None
+
+    def get(self, session_id: str) -> Union[Dict[str, Any], None]:
+        """
+        returns the record of a session, None if missing or expired
+        """
+        value = self._get(session_id)
+        return value["record"] if value is not None else None
+
+    def set(self, session_id: str, record: Dict[str, Any],
+            ttl: float = 0) -> None:
+        """
+        sets the record of a session
+        """
+        self._set(session_id, {"record": record, "ttl": ttl}, ttl)
+
+    def delete(self, session_id: str) -> bool:
+        """
+        deletes a session
+        """
+        return self.command('DEL', self._key(session_id)) > 0
+
+    def touch(self, session_id: str) -> bool:
+        """
+        updates `last_seen` and the expiration of a session
+        """
+        value = self._get(session_id)
+        if value is None:
+            return False
+        value["record"]["last_seen"] = time.time()
+        return self._set(session_id, value, value["ttl"], exists=True)
+
+    def expire(self, session_id: str, ttl: float) -> bool:
+        """
+        sets the time to live of a session
+        """
+        value = self._get(session_id)
+        if value is None:
+            return False
+        value["ttl"] = ttl if ttl > 0 else 0
+        return self._set(session_id, value, value["ttl"], exists=True)
+
+    def reap(self) -> int:
+        """
+        the server removes the expired sessions itself
+        """
+        return 0
+
+
+def session_store_from_env(ttl: float = 0) -> Union[SessionStore, None]:
+    """
+    returns the session store selected by the environment variable
+    `SESSION_STORE`:
+        - `memory`: in the process
+        - `file`: in `.db_UserSession.json`
+        - `sqlite`: in the SQLite database `SESSION_STORE_PATH`
+        - `resp`: in the Redis protocol server `SESSION_STORE_URL`
+    None if `SESSION_STORE` is not set.
+    `ttl` is the time to live of the sessions already saved without one
+    """
+    store = os.getenv('SESSION_STORE')
+    if store is None or store == '':
+        return None
+    if store == 'memory':
+        return MemorySessionStore()
+    if store == 'file':
+        return FileSessionStore(ttl)
+    if store == 'sqlite':
+        return SQLiteSessionStore(
+            os.getenv('SESSION_STORE_PATH', '.db_sessions.sqlite'))
+    if store == 'resp':
+        return RespSessionStore(
+            os.getenv('SESSION_STORE_URL', 'redis://127.0.0.1:6379/0'))
+    raise ValueError("unknown SESSION_STORE {}".format(store))
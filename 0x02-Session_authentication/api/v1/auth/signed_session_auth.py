@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Signed Session authentication module.
+
+The session cookie is a token carrying the user id and the issue time,
+signed with HMAC-SHA256: `<user_id>.<issued_at>.<nonce>.<signature>`.
+A token is validated without any storage lookup; logged out tokens are
+kept in an in-memory deny-list until they expire
+"""
+from api.v1.auth.auth import Auth
+import base64
+import hashlib
+import heapq
+import hmac
+import os
+import threading
+import time
+from typing import Tuple, TypeVar, Union
+
+
+class DenyList:
+    """
+    Revoked token signatures, each kept until its token expires
+    """
+
+    def __init__(self):
+        """Instantiation method"""
+        # {signature: expiration time (None: never)}
+        self.signatures = {}
+        # (expiration time, signature), ordered by time
+        self._expiration_heap = []
+        self._lock = threading.Lock()
+
+    def add(self, signature: str,
+            expires_at: Union[float, None] = None) -> None:
+        """
+        revokes a signature until `expires_at`
+        """
+        with self._lock:
+            self.signatures[signature] = expires_at
+            if expires_at is not None:
+                heapq.heappush(self._expiration_heap,
+                               (expires_at, signature))
+            self._prune(time.time())
+
+    def __contains__(self, signature: str) -> bool:
+        """
+        returns True if a signature is revoked
+        """
+        return signature in self.signatures
+
+    def __len__(self) -> int:
+        """
+        returns the number of revoked signatures
+        """
+        return len(self.signatures)
+
+    def _prune(self, now: float) -> None:
+        """
+        drops the signatures of the expired tokens, which are rejected
+        anyway
+        """
+        heap = self._expiration_heap
+        while len(heap) > 0 and heap[0][0] < now:
+            expires_at, signature = heapq.heappop(heap)
+            if self.signatures.get(signature) == expires_at:
+                del self.signatures[signature]
+
+
+class SignedSessionAuth(Auth):
+    """
+    Implements Session Authentication with signed session tokens
+    """
+
+    def __init__(self):
+        """Instantiation method"""
+        # the signing key, shared by all the workers through
+        # `SESSION_SECRET`. Without it, the tokens are only valid in this
+        # process
+        secret = os.getenv('SESSION_SECRET')
+        if secret:
+            self._secret = secret.encode('utf-8')
+        else:
+            self._secret = os.urandom(32)
+        try:
+            self.session_duration = int(os.getenv('SESSION_DURATION'))
+        except (ValueError, TypeError):
+            self.session_duration = 0
+        self.deny_list = DenyList()
+
+    def _sign(self, payload: str) -> str:
+        """
+        returns the signature of a token payload
+        """
+        # a cookie can carry lone surrogates, signed as they are
+        digest = hmac.new(self._secret,
+                          payload.encode('utf-8', 'surrogatepass'),
+                          hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+    def create_session(self, user_id: Union[str, None] = None) -> str:
+        """
+        Creates a signed session token for a user based on `user_id`
+        """
+        if user_id is None or not isinstance(user_id, str) \
+                or '.' in user_id:
+            return None
+
+        payload = '{}.{:d}.{}'.format(user_id, int(time.time()),
+                                      os.urandom(6).hex())
+        return '{}.{}'.format(payload, self._sign(payload))
+
+    def verify_session(self, session_id: Union[str, None] = None
+                       ) -> Union[Tuple[str, int, str], None]:
+        """
+        returns the `user_id`, issue time and signature of a session token,
+        None if the token is malformed, forged, expired or revoked
+        """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+        payload, _, signature = session_id.rpartition('.')
+        parts = payload.split('.')
+        if len(parts) != 3:
+            return None
+        # signatures are base64, `compare_digest` only takes ASCII strings
+        if not signature.isascii() or \
+                not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+
+        user_id, issued_at = parts[0], parts[1]
+        try:
+            issued_at = int(issued_at)
+        except ValueError:
+            return None
+        if self.session_duration > 0 \
+                and issued_at + self.session_duration < time.time():
+            return None
+        if signature in self.deny_list:
+            return None
+
+        return user_id, issued_at, signature
+
+    def user_id_for_session_id(self,
+                               session_id: Union[str, None] = None
+                               ) -> Union[str, None]:
+        """
+        Returns the `user_id` of a valid session token
+        """
+        session = self.verify_session(session_id)
+        if session is None:
+            return None
+
+        return session[0]
+
+    def current_user(self, request=None) -> Union[None, TypeVar('User')]:
+        """
+        returns a `User` instance based on the session cookie value
+        """
+        from models.user import User
+
+        if request is None:
+            return None
+
+        user_id = self.user_id_for_session_id(self.session_cookie(request))
+        if user_id is None:
+            return None
+
+        return User.get(user_id)
+
+    def destroy_session(self, request=None) -> bool:
+        """
+        revokes the session token of the cookie
+        """
+        if request is None:
+            return False
+
+        session = self.verify_session(self.session_cookie(request))
+        if session is None:
+            return False
+
+        _, issued_at, signature = session
+        expires_at = None
+        if self.session_duration > 0:
+            expires_at = issued_at + self.session_duration
+        self.deny_list.add(signature, expires_at)
+
+        return True
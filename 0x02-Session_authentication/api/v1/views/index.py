@@ -18,11 +18,16 @@ def status() -> str:
 def stats() -> str:
     """ GET /api/v1/stats
     Return:
-      - the number of each objects
+      - the number of each objects, and of the expired sessions
+        removed by the reaper
     """
+    from api.v1.app import auth
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    reaper = getattr(auth, 'session_reaper', None)
+    if reaper is not None:
+        stats['reclaimed_sessions'] = reaper.reclaimed
     return jsonify(stats)
 
 
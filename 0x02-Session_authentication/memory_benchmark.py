@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+""" Memory benchmark of the models: bytes per `User` and `UserSession` in
+their steady state in a worker, loaded from their file, then after a
+`save_to_file()`, a `to_json()` and a `to_json_str()` (the list of
+`GET /api/v1/users`) of every object.
+
+The same measure runs on another checkout of this directory when given,
+e.g. the layout before the slots:
+    git worktree add /tmp/before <commit>
+    ./memory_benchmark.py 100000 /tmp/before/0x02-Session_authentication
+
+Usage: ./memory_benchmark.py [number of objects (default 100000)]
+[other directory]
+"""
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import uuid
+from typing import Dict
+
+STAGES = ('loaded', 'saved', 'to_json', 'to_json_str')
+
+
+def user_kwargs(i: int) -> dict:
+    """ Attributes of the `i`-th user
+    """
+    return {'email': 'user{}@example.com'.format(i),
+            '_password': '{:064x}'.format(i),
+            'first_name': 'First{}'.format(i),
+            'last_name': 'Last{}'.format(i)}
+
+
+def session_kwargs(i: int) -> dict:
+    """ Attributes of the `i`-th session
+    """
+    return {'user_id': str(uuid.uuid4()), 'session_id': str(uuid.uuid4()),
+            'last_seen': 1700000000.0 + i, 'ttl': 3600,
+            'expires_at': 1700003600.0 + i}
+
+
+def measure(cls: type, kwargs, count: int) -> Dict[str, float]:
+    """ Bytes per object of `count` objects of `cls` at each stage
+    """
+    from models.base import DATA
+
+    s_class = cls.__name__
+    DATA[s_class] = {}
+    for i in range(count):
+        obj = cls(**kwargs(i))
+        # attributes the model doesn't know are set as well
+        for key, value in kwargs(i).items():
+            setattr(obj, key, value)
+        DATA[s_class][obj.id] = obj
+    cls.save_to_file()
+    DATA[s_class] = {}
+    gc.collect()
+
+    sizes = {}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cls.load_from_file()
+    for stage in STAGES:
+        if stage == 'saved':
+            cls.save_to_file()
+        elif stage == 'to_json':
+            for obj in list(DATA[s_class].values()):
+                obj.to_json()
+        elif stage == 'to_json_str':
+            # before the JSON strings, the layout of the checkout compared
+            to_json_str = getattr(cls, 'to_json_str',
+                                  lambda obj: json.dumps(obj.to_json()))
+            for obj in list(DATA[s_class].values()):
+                to_json_str(obj)
+        gc.collect()
+        sizes[stage] = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+    DATA[s_class] = {}
+    return sizes
+
+
+def run(directory: str, count: int):
+    """ Print the bytes per object of the models of `directory` as JSON
+    """
+    # the models keep their files in the current directory
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, directory)
+    from models.user import User
+    from models.user_session import UserSession
+
+    print(json.dumps({'User': measure(User, user_kwargs, count),
+                      'UserSession': measure(UserSession, session_kwargs,
+                                             count)}))
+
+
+def main(count: int, other: str = None):
+    """ Print the bytes per object of each stage, for this directory and
+    `other`, each measured in its own process
+    """
+    directories = [os.path.dirname(os.path.abspath(__file__))]
+    if other is not None:
+        directories.append(os.path.abspath(other))
+    results = []
+    for directory in directories:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run', directory,
+             str(count)], stdout=subprocess.PIPE, check=True).stdout
+        results.append(json.loads(output.decode('utf-8')))
+
+    print("{:d} objects, Python {}".format(count, sys.version.split()[0]))
+    for i, directory in enumerate(directories):
+        print("[{}] {}".format(i, directory))
+    print("{:<24}".format("") + "".join("{:>10}".format("[{}]".format(i))
+                                        for i in range(len(results))))
+    for name in ('User', 'UserSession'):
+        for stage in STAGES:
+            print("{:<24}".format("{} {}".format(name, stage)) + "".join(
+                "{:>8.0f} B".format(result[name][stage])
+                for result in results))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) > 0 and args[0] == '--run':
+        run(args[1], int(args[2]))
+    else:
+        main(int(args[0]) if len(args) > 0 else 100000,
+             args[1] if len(args) > 1 else None)
@@ -1,37 +1,255 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, TypeVar, List, Iterable
-from os import path
+from typing import (Any, BinaryIO, Dict, Iterator, TypeVar, List, Iterable,
+                    Tuple, Union)
+from os import getenv, path, remove
+import atexit
+import heapq
 import json
+import mmap
+import os
+import tempfile
+import threading
+import time
 import uuid
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+# `snapshot`: each save/remove rewrites `.db_<Class>.json`
+# `journal`: each save/remove appends a record to `.db_<Class>.journal`
+# `write_behind`: each save/remove marks the class dirty, the file is
+#   written by a flusher thread
+STORE_MODE = getenv('STORE_MODE', 'snapshot')
+# number of journal records that triggers a compaction into the snapshot
+JOURNAL_COMPACT_THRESHOLD = int(getenv('STORE_JOURNAL_COMPACT', '1000'))
+# number of records in the journal by class
+JOURNAL_SIZES = {}
+# `none`: never fsync, the OS decides when the data reaches the disk
+# `flush`: fsync the snapshots (every write in snapshot mode, compactions
+#   in journal mode and flushes in write-behind mode)
+# `always`: fsync the snapshots and every record of the journal
+FSYNC_POLICY = getenv('STORE_FSYNC', 'none')
+# write-behind: delay and number of mutations before a class is flushed
+FLUSH_INTERVAL_MS = int(getenv('STORE_FLUSH_INTERVAL_MS', '1000'))
+FLUSH_MAX_PENDING = int(getenv('STORE_FLUSH_MAX_PENDING', '100'))
+# write-behind: unflushed mutations by class, and the dirty classes
+PENDING = {}
+DIRTY_CLASSES = {}
+# write-behind: mutations saved from a file write, by class
+COALESCED_WRITES = {}
+_PENDING_LOCK = threading.Lock()
+_FLUSHER = None
+# hash indexes by class: {attribute: {value: object id or {object id: None}}}
+INDEXES = {}
+# values under which an object is currently indexed, by class and id,
+# in the order of `_indexed_attributes` (the value itself for a single
+# indexed attribute)
+INDEXED_VALUES = {}
+# bucket of the objects whose value can't be hashed
+_UNHASHABLE = object()
+# objects not indexed
+_UNINDEXED = object()
+# slots of each class, base class first
+SLOTS = {}
+# slots holding caches, never serialized
+CACHE_SLOTS = ('_json_str',)
+# number of objects of each class keeping their JSON string: past it, the
+# strings of the objects cached first are dropped
+JSON_CACHE_SIZE = int(getenv('STORE_JSON_CACHE_SIZE', '10000'))
+# objects keeping their JSON string by class, cached first first
+JSON_CACHED = {}
+_JSON_CACHED_LOCK = threading.Lock()
+# decode the objects from the snapshot on first access
+LAZY_LOAD = getenv('STORE_LAZY_LOAD', '0') == '1'
+# several processes share the files: writes hold a lock on
+# `.db_<Class>.lock`, and a process reloads a class (or replays the new
+# records of its journal) when its files changed
+MULTIPROCESS = getenv('STORE_MULTIPROCESS', '0') == '1' and fcntl is not None
+# states of the files of each class when last read or written,
+# see `_file_state`
+FILE_STATES = {}
+# saves/removals of this process not written yet, by class:
+# {object id: object or None}
+LOCAL_CHANGES = {}
+# classes whose lock is held by the current thread
+_HELD_LOCKS = threading.local()
+# locks of each class: `DATA` and the indexes are only read or changed
+# under the class lock, writes of the files are serialized by the
+# write lock (taken before the class lock)
+CLASS_LOCKS = {}
+WRITE_LOCKS = {}
+_LOCKS_LOCK = threading.Lock()
+# mode of the new snapshots, as `open` creates them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+class LazyObjects(MutableMapping):
+    """ Objects of a class, decoded from the snapshot on first access.
+    Loading only records the offsets of each object in the file (and the
+    values of the indexed attributes), the file itself is memory-mapped
+    """
+
+    def __init__(self, cls: type, file_path: str):
+        """ Scan the snapshot `file_path` of the class `cls`
+        """
+        self._cls = cls
+        self._objs = {}
+        self._offsets = {}
+        self._scanned = {}
+        self._buffer = b'{}'
+        if os.path.getsize(file_path) > 0:
+            with open(file_path, 'rb') as f:
+                self._buffer = mmap.mmap(f.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+        self._scan()
+
+    def _scan(self):
+        """ Record the offsets of the objects of the snapshot
+        """
+        text = self._buffer[:].decode('utf-8')
+        if len(text) != len(self._buffer):
+            # offsets in the text are not offsets in the file
+            self._buffer = text
+        decoder = json.JSONDecoder()
+        attrs = self._cls._indexed_attributes
+
+        def skip(pos: int) -> int:
+            return json.decoder.WHITESPACE.match(text, pos).end()
+
+        pos = skip(0)
+        if text[pos] != '{':
+            raise ValueError("Expecting a JSON object")
+        pos = skip(pos + 1)
+        while text[pos] != '}':
+            obj_id, pos = json.decoder.scanstring(text, pos + 1)
+            pos = skip(skip(pos) + 1)
+            obj_json, end = decoder.raw_decode(text, pos)
+            self._offsets[obj_id] = (pos, end)
+            self._scanned[obj_id] = {attr: obj_json.get(attr)
+                                     for attr in attrs}
+            pos = skip(end)
+            if text[pos] == ',':
+                pos = skip(pos + 1)
+
+    def _decode(self, obj_id: str) -> dict:
+        """ Decode the JSON dictionary of an object of the snapshot
+        """
+        start, end = self._offsets[obj_id]
+        return json.loads(self._buffer[start:end])
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Return an object, decoded on first access
+        """
+        obj = self._objs.get(obj_id)
+        if obj is None:
+            obj = self._cls(**self._decode(obj_id))
+            self._objs[obj_id] = obj
+            del self._offsets[obj_id]
+        return obj
+
+    def __setitem__(self, obj_id: str, obj: TypeVar('Base')):
+        """ Set an object
+        """
+        self._objs[obj_id] = obj
+        self._offsets.pop(obj_id, None)
+
+    def __delitem__(self, obj_id: str):
+        """ Delete an object
+        """
+        if obj_id in self._objs:
+            del self._objs[obj_id]
+        else:
+            del self._offsets[obj_id]
+
+    def peek(self, obj_id: str) -> Union[TypeVar('Base'), None]:
+        """ Return an object, decoded but not kept if it wasn't accessed
+        yet
+        """
+        obj = self._objs.get(obj_id)
+        if obj is None and obj_id in self._offsets:
+            obj = self._cls(**self._decode(obj_id))
+        return obj
+
+    def __contains__(self, obj_id: object) -> bool:
+        """ Check for an object without decoding it
+        """
+        return obj_id in self._objs or obj_id in self._offsets
+
+    def __iter__(self) -> Iterator[str]:
+        """ Iterate over the ids of the objects
+        """
+        return iter(list(self._offsets) + list(self._objs))
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return len(self._objs) + len(self._offsets)
+
+    def serialized_items(self) -> Iterator[Tuple[str, dict]]:
+        """ Iterate over the JSON dictionaries of the objects, without
+        building the objects not accessed yet
+        """
+        for obj_id in list(self._offsets):
+            yield obj_id, self._decode(obj_id)
+        for obj_id, obj in list(self._objs.items()):
+            yield obj_id, obj.to_json(True)
+
+    def indexed_values(self) -> Iterator[Tuple[str, dict]]:
+        """ Iterate over the values of the indexed attributes of the
+        objects, without building the objects not accessed yet
+        """
+        attrs = self._cls._indexed_attributes
+        for obj_id in list(self._offsets):
+            values = self._scanned.pop(obj_id, None)
+            if values is None:
+                obj_json = self._decode(obj_id)
+                values = {attr: obj_json.get(attr) for attr in attrs}
+            yield obj_id, values
+        self._scanned = {}
+        for obj_id, obj in list(self._objs.items()):
+            yield obj_id, {attr: getattr(obj, attr, None) for attr in attrs}
 
 
 class Base():
-    """ Base class
+    """ Base class.
+    Attributes are stored in `__slots__`, subclasses declare theirs
     """
+    __slots__ = ('id', 'created_at', 'updated_at') + CACHE_SLOTS
+    # attributes looked up through a hash index by `search`
+    _indexed_attributes: Tuple[str, ...] = ()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        DATA.setdefault(s_class, {})
 
+        # JSON string of `to_json()`, dropped when an attribute is set
+        self._json_str = None
         self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+        created_at = kwargs.get('created_at')
+        updated_at = kwargs.get('updated_at')
+        if created_at is not None:
+            self.created_at = parse_timestamp(created_at)
         else:
             self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+        if updated_at == created_at:
+            # objects never updated share one (immutable) datetime
+            self.updated_at = self.created_at
+        elif updated_at is not None:
+            self.updated_at = parse_timestamp(updated_at)
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,69 +262,389 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def __setattr__(self, key: str, value: Any):
+        """ Set an attribute, and drop the cached JSON string
+        """
+        object.__setattr__(self, key, value)
+        if key not in CACHE_SLOTS:
+            object.__setattr__(self, '_json_str', None)
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._attributes():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+                result[key] = format_timestamp(value)
             else:
                 result[key] = value
         return result
 
+    def to_json_str(self, cache: bool = True) -> str:
+        """ Convert the object to a JSON string (of `to_json()`), cached
+        until an attribute is set unless `cache` is False
+        """
+        json_str = self._json_str
+        if json_str is None:
+            json_str = json.dumps(self.to_json(), sort_keys=True,
+                                  separators=(',', ':'))
+            if cache and JSON_CACHE_SIZE > 0:
+                self._json_str = json_str
+                self._keep_cached()
+        return json_str
+
+    def _keep_cached(self):
+        """ Record that the object keeps its JSON string, and drop the
+        strings of the objects of its class cached first past
+        `JSON_CACHE_SIZE` objects
+        """
+        with _JSON_CACHED_LOCK:
+            cached = JSON_CACHED.setdefault(self.__class__.__name__,
+                                            OrderedDict())
+            cached[self.id] = self
+            cached.move_to_end(self.id)
+            while len(cached) > JSON_CACHE_SIZE:
+                cached.popitem(last=False)[1]._json_str = None
+
+    def _attributes(self) -> Iterator[Tuple[str, Any]]:
+        """ Iterate over the attributes of the object, slots first in the
+        order of declaration, then the `__dict__` of a subclass without
+        `__slots__`
+        """
+        for key in _slots(self.__class__):
+            try:
+                yield key, getattr(self, key)
+            except AttributeError:
+                continue
+        yield from getattr(self, '__dict__', {}).items()
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        with _file_lock(s_class), _class_lock(s_class):
+            if MULTIPROCESS:
+                FILE_STATES[s_class] = _file_state(s_class)
+            DATA[s_class] = {}
+            if path.exists(file_path) and LAZY_LOAD:
+                DATA[s_class] = LazyObjects(cls, file_path)
+            elif path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    objs_json = json.load(f)
+                    for obj_id, obj_json in objs_json.items():
+                        DATA[s_class][obj_id] = cls(**obj_json)
+            journal_end = cls._replay_journal()
+            if MULTIPROCESS:
+                FILE_STATES[s_class] = _replayed_state(FILE_STATES[s_class],
+                                                       journal_end)
+            cls._build_indexes()
+            cls._apply_local_changes()
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to file.
+        The snapshot holds every record of the journal, which is dropped
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with _write_lock(s_class), _file_lock(s_class, exclusive=True):
+            # first merge the writes of the other processes
+            cls._sync()
+            objs_json = {}
+            objs = []
+            with _class_lock(s_class):
+                written = dict(LOCAL_CHANGES.get(s_class, {}))
+                if isinstance(DATA[s_class], LazyObjects):
+                    objs_json = dict(DATA[s_class].serialized_items())
+                else:
+                    objs = list(DATA[s_class].items())
+            # objects are serialized out of the class lock
+            for obj_id, obj in objs:
+                objs_json[obj_id] = obj.to_json(True)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            _write_atomic(file_path, objs_json, FSYNC_POLICY != 'none')
+
+            journal_path = ".db_{}.journal".format(s_class)
+            if path.exists(journal_path):
+                remove(journal_path)
+            JOURNAL_SIZES[s_class] = 0
+            if MULTIPROCESS:
+                cls._written(written)
+                FILE_STATES[s_class] = _file_state(s_class)
+
+    @classmethod
+    def append_to_journal(cls, obj_id: str,
+                          obj: Union[TypeVar('Base'), None] = None):
+        """ Append a save (or a removal if `obj` is None) to the journal,
+        and compact the journal into the snapshot past the threshold
+        """
+        cls._append_records({obj_id: obj})
+
+    @classmethod
+    def _append_records(cls,
+                        changes: Dict[str, Union[TypeVar('Base'), None]]):
+        """ Append the saves (or removals if the object is None) of
+        `changes` to the journal in a single write, and compact the journal
+        into the snapshot past the threshold
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        records = []
+        for obj_id, obj in changes.items():
+            record = {"id": obj_id}
+            if obj is not None:
+                record["obj"] = obj.to_json(True)
+            records.append(json.dumps(record).encode('utf-8') + b"\n")
+
+        with _write_lock(s_class), _file_lock(s_class, exclusive=True):
+            # first replay the records of the other processes
+            cls._sync()
+            with open(journal_path, 'a+b') as f:
+                # a torn record left by a crash is dropped, the new records
+                # start on a fresh line
+                _truncate_torn_record(f)
+                f.write(b"".join(records))
+                if FSYNC_POLICY == 'always':
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            JOURNAL_SIZES[s_class] = \
+                JOURNAL_SIZES.get(s_class, 0) + len(records)
+            if MULTIPROCESS:
+                cls._written(changes)
+                FILE_STATES[s_class] = _file_state(s_class)
+            if JOURNAL_SIZES[s_class] >= JOURNAL_COMPACT_THRESHOLD:
+                cls.save_to_file()
+
+    @classmethod
+    def _replay_journal(cls, offset: Union[int, None] = None
+                        ) -> Union[int, None]:
+        """ Apply the records of the journal to `DATA`.
+        With an `offset`, only the records from this position of the file
+        are applied, and indexed.
+        Return the position after the last complete record, None if there
+        is no journal
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        if offset is None:
+            JOURNAL_SIZES[s_class] = 0
+        if not path.exists(journal_path):
+            return None
+
+        with open(journal_path, 'rb') as f:
+            end = f.seek(offset or 0)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # torn write of the last record, truncated by the
+                    # next append
+                    break
+                end += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # torn record followed by other records
+                    continue
+                obj_id = record["id"]
+                if record.get("obj") is None:
+                    DATA[s_class].pop(obj_id, None)
+                    if offset is not None:
+                        cls._unindex(obj_id)
+                else:
+                    obj = cls(**record["obj"])
+                    DATA[s_class][obj_id] = obj
+                    if offset is not None:
+                        cls._index(obj)
+                JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + 1
+        return end
+
+    @classmethod
+    def _sync(cls):
+        """ Reload the class if another process changed its files: only
+        the new records if the journal just grew, else everything.
+        The changes of this process not written yet are applied again
+        """
+        if not MULTIPROCESS:
+            return
+        s_class = cls.__name__
+        if _file_state(s_class) == FILE_STATES.get(s_class):
+            return
+
+        with _file_lock(s_class):
+            old_state = FILE_STATES.get(s_class)
+            state = _file_state(s_class)
+            if state == old_state:
+                return
+            offset = None
+            journal = state[1]
+            if old_state is not None and old_state[0] == state[0] \
+                    and journal is not None:
+                if old_state[1] is None:
+                    offset = 0
+                elif old_state[1][0] == journal[0] \
+                        and old_state[1][1] <= journal[1]:
+                    offset = old_state[1][1]
+            if offset is None:
+                cls.load_from_file()
+                return
+            with _class_lock(s_class):
+                journal_end = cls._replay_journal(offset)
+                FILE_STATES[s_class] = _replayed_state(state, journal_end)
+                cls._apply_local_changes()
+
+    @classmethod
+    def _apply_local_changes(cls):
+        """ Apply the saves/removals of this process not written yet
+        """
+        changes = LOCAL_CHANGES.get(cls.__name__)
+        if not changes:
+            return
+        objs = DATA[cls.__name__]
+        for obj_id, obj in list(changes.items()):
+            if obj is None:
+                if obj_id in objs:
+                    del objs[obj_id]
+                cls._unindex(obj_id)
+            else:
+                objs[obj_id] = obj
+                cls._index(obj)
+
+    @classmethod
+    def _written(cls, changes: Dict[str, Union[TypeVar('Base'), None]]):
+        """ Forget the local changes that were written, unless they were
+        changed again meanwhile
+        """
+        with _class_lock(cls.__name__):
+            local_changes = LOCAL_CHANGES.get(cls.__name__, {})
+            for obj_id, obj in changes.items():
+                if obj_id in local_changes and local_changes[obj_id] is obj:
+                    del local_changes[obj_id]
+
+    @classmethod
+    def _write(cls, obj_id: str, obj: Union[TypeVar('Base'), None] = None):
+        """ Persist a save (or a removal if `obj` is None) of an object
+        """
+        cls._write_many({obj_id: obj})
+
+    @classmethod
+    def _write_many(cls, changes: Dict[str, Union[TypeVar('Base'), None]]):
+        """ Persist the saves (or removals if the object is None) of
+        `changes` at once: one journal write, one mutation of the
+        write-behind count each, or one snapshot
+        """
+        if STORE_MODE == 'journal':
+            cls._append_records(changes)
+        elif STORE_MODE == 'write_behind':
+            cls._mark_dirty(len(changes))
+        else:
+            cls.save_to_file()
+
+    @classmethod
+    def _mark_dirty(cls, count: int = 1):
+        """ Record `count` unflushed mutations of the class, flush it right
+        away past `FLUSH_MAX_PENDING` mutations
+        """
+        s_class = cls.__name__
+        with _PENDING_LOCK:
+            PENDING[s_class] = PENDING.get(s_class, 0) + count
+            DIRTY_CLASSES[s_class] = cls
+            pending = PENDING[s_class]
+        _start_flusher()
+        if pending >= FLUSH_MAX_PENDING:
+            cls.flush()
+
+    @classmethod
+    def flush(cls):
+        """ Write the file of the class if it has unflushed mutations
+        """
+        s_class = cls.__name__
+        with _PENDING_LOCK:
+            pending = PENDING.pop(s_class, 0)
+        if pending == 0:
+            return
+        cls.save_to_file()
+        COALESCED_WRITES[s_class] = \
+            COALESCED_WRITES.get(s_class, 0) + pending - 1
+
+    @classmethod
+    def coalesced_writes(cls) -> int:
+        """ Number of file writes saved by the write-behind mode
+        """
+        return COALESCED_WRITES.get(cls.__name__, 0)
 
     def save(self):
         """ Save current object
         """
+        self._save()
+
+    def save_if_stored(self) -> bool:
+        """ Save the object only if it is still stored: an object removed
+        meanwhile (e.g. by another thread) is not added back.
+        Returns False if it wasn't stored
+        """
+        return self._save(if_stored=True)
+
+    def _save(self, if_stored: bool = False) -> bool:
+        """ Save the object, if it is stored when `if_stored`
+        """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with _class_lock(s_class):
+            if if_stored and DATA[s_class].get(self.id) is None:
+                return False
+            self.updated_at = datetime.utcnow()
+            DATA[s_class][self.id] = self
+            if MULTIPROCESS:
+                LOCAL_CHANGES.setdefault(s_class, {})[self.id] = self
+            self.__class__._index(self)
+        self.__class__._write(self.id, self)
+        return True
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        with _class_lock(s_class):
+            if DATA[s_class].get(self.id) is None:
+                return
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            if MULTIPROCESS:
+                LOCAL_CHANGES.setdefault(s_class, {})[self.id] = None
+            self.__class__._unindex(self.id)
+        self.__class__._write(self.id)
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')]) -> int:
+        """ Remove objects, and persist the removals at once.
+        Return the number of objects removed
+        """
+        s_class = cls.__name__
+        changes = {}
+        with _class_lock(s_class):
+            stored = DATA[s_class]
+            for obj in objs:
+                if obj.id in changes or obj.id not in stored:
+                    continue
+                del stored[obj.id]
+                if MULTIPROCESS:
+                    LOCAL_CHANGES.setdefault(s_class, {})[obj.id] = None
+                cls._unindex(obj.id)
+                changes[obj.id] = None
+        if len(changes) > 0:
+            cls._write_many(changes)
+        return len(changes)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        cls._sync()
+        with _class_lock(s_class):
+            return len(DATA[s_class])
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -119,13 +657,62 @@ class Base():
         """ Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        cls._sync()
+        with _class_lock(s_class):
+            return DATA[s_class].get(id)
+
+    @classmethod
+    def ids(cls) -> List[str]:
+        """ Return the ids of all objects
+        """
+        s_class = cls.__name__
+        cls._sync()
+        with _class_lock(s_class):
+            return list(DATA[s_class])
+
+    @classmethod
+    def get_many(cls, obj_ids: Iterable[str]) -> List[TypeVar('Base')]:
+        """ Return the objects of `obj_ids` still stored, in this order.
+        In lazy mode, the objects not accessed yet are decoded but not kept
+        """
+        s_class = cls.__name__
+        cls._sync()
+        with _class_lock(s_class):
+            objs = DATA[s_class]
+            if isinstance(objs, LazyObjects):
+                found = map(objs.peek, obj_ids)
+            else:
+                found = map(objs.get, obj_ids)
+            return [obj for obj in found if obj is not None]
+
+    @classmethod
+    def page(cls, limit: int,
+             cursor: Union[str, None] = None) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects in the order of their ids,
+        starting after the id `cursor`
+        """
+        s_class = cls.__name__
+        cls._sync()
+        with _class_lock(s_class):
+            objs = DATA[s_class]
+            obj_ids = iter(objs)
+            if cursor is not None:
+                obj_ids = (obj_id for obj_id in obj_ids if obj_id > cursor)
+            return [objs[obj_id]
+                    for obj_id in heapq.nsmallest(limit, obj_ids)]
+
+    @classmethod
+    def json_attributes(cls) -> List[str]:
+        """ Return the attributes of the class in `to_json()`
+        """
+        return [key for key in _slots(cls) if key[0] != '_']
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
         s_class = cls.__name__
+        cls._sync()
 
         def _search(obj):
             if len(attributes) == 0:
@@ -135,4 +722,321 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        # the candidates are a snapshot, filtered out of the class lock
+        with _class_lock(s_class):
+            objs = DATA[s_class]
+            obj_ids = cls._lookup(attributes)
+            if obj_ids is None:
+                candidates = list(objs.values())
+            else:
+                # candidates from the index are still checked against
+                # the query
+                candidates = [objs[obj_id] for obj_id in obj_ids
+                              if obj_id in objs]
+        return list(filter(_search, candidates))
+
+    @classmethod
+    def _build_indexes(cls):
+        """ Rebuild the indexes of the class from `DATA`
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls._indexed_attributes}
+        INDEXED_VALUES[s_class] = {}
+        if isinstance(DATA[s_class], LazyObjects):
+            for obj_id, values in DATA[s_class].indexed_values():
+                cls._index_values(obj_id, values)
+            return
+        for obj in DATA[s_class].values():
+            cls._index(obj)
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base')):
+        """ Index (or re-index) an object on the indexed attributes
+        """
+        if len(cls._indexed_attributes) == 0:
+            return
+        values = {attr: getattr(obj, attr, None)
+                  for attr in cls._indexed_attributes}
+        cls._index_values(obj.id, values)
+
+    @classmethod
+    def _index_values(cls, obj_id: str, values: Dict[str, Any]):
+        """ Index (or re-index) an object id on the values of the indexed
+        attributes
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            cls._build_indexes()
+        cls._unindex(obj_id)
+
+        indexed = []
+        for attr in cls._indexed_attributes:
+            index = INDEXES[s_class][attr]
+            value = values.get(attr)
+            try:
+                bucket = index.get(value)
+            except TypeError:
+                value = _UNHASHABLE
+                bucket = index.get(value)
+            # a bucket holding a single object is the id itself
+            if bucket is None:
+                index[value] = obj_id
+            elif type(bucket) is str:
+                index[value] = {bucket: None, obj_id: None}
+            else:
+                bucket[obj_id] = None
+            indexed.append(value)
+        INDEXED_VALUES[s_class][obj_id] = \
+            indexed[0] if len(indexed) == 1 else tuple(indexed)
+
+    @classmethod
+    def _unindex(cls, obj_id: str):
+        """ Remove an object from the indexes
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, _UNINDEXED)
+        if values is _UNINDEXED:
+            return
+        if len(cls._indexed_attributes) == 1:
+            values = (values,)
+        for attr, value in zip(cls._indexed_attributes, values):
+            index = INDEXES[s_class][attr]
+            bucket = index.get(value)
+            if bucket is None:
+                continue
+            if type(bucket) is str:
+                if bucket == obj_id:
+                    del index[value]
+                continue
+            bucket.pop(obj_id, None)
+            if len(bucket) == 1:
+                index[value] = next(iter(bucket))
+
+    @classmethod
+    def _lookup(cls, attributes: dict) -> Union[List[str], None]:
+        """ Return the ids of the candidate objects for a search, from
+        the smallest index bucket matching the query.
+        None if no indexed attribute is part of the query
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            if len(cls._indexed_attributes) == 0:
+                return None
+            cls._build_indexes()
+
+        def _ids(bucket: Union[str, dict, None]) -> List[str]:
+            if bucket is None:
+                return []
+            if type(bucket) is str:
+                return [bucket]
+            return list(bucket)
+
+        candidates = None
+        for attr, value in attributes.items():
+            index = INDEXES[s_class].get(attr)
+            if index is None:
+                continue
+            try:
+                bucket = _ids(index.get(value))
+            except TypeError:
+                # unhashable query values can't be looked up
+                continue
+            bucket.extend(_ids(index.get(_UNHASHABLE)))
+            if candidates is None or len(bucket) < len(candidates):
+                candidates = bucket
+        return candidates
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a `TIMESTAMP_FORMAT` string, through `fromisoformat` which
+    is much faster than `strptime`
+    """
+    if len(value) == 19 and value[10] == 'T' \
+            and value[13] == ':' and value[16] == ':':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    # same error as before on a malformed timestamp
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    """ Format a datetime as `TIMESTAMP_FORMAT`, through `isoformat`
+    which is much faster than `strftime`
+    """
+    if value.tzinfo is None and value.year >= 1000:
+        return value.isoformat(timespec='seconds')
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _slots(cls: type) -> Tuple[str, ...]:
+    """ Return the slots of a class and of its parents, base class first
+    """
+    slots = SLOTS.get(cls)
+    if slots is None:
+        slots = ()
+        for klass in reversed(cls.__mro__):
+            slots += tuple(slot for slot in klass.__dict__.get('__slots__', ())
+                           if slot not in CACHE_SLOTS)
+        SLOTS[cls] = slots
+    return slots
+
+
+def _class_lock(s_class: str) -> threading.RLock:
+    """ Return the lock of `DATA` and of the indexes of a class
+    """
+    lock = CLASS_LOCKS.get(s_class)
+    if lock is None:
+        with _LOCKS_LOCK:
+            lock = CLASS_LOCKS.setdefault(s_class, threading.RLock())
+    return lock
+
+
+def _write_lock(s_class: str) -> threading.RLock:
+    """ Return the lock serializing the writes of the files of a class
+    """
+    lock = WRITE_LOCKS.get(s_class)
+    if lock is None:
+        with _LOCKS_LOCK:
+            lock = WRITE_LOCKS.setdefault(s_class, threading.RLock())
+    return lock
+
+
+def _file_state(s_class: str) -> Tuple[Any, Any]:
+    """ Return the state of the files of a class: (inode, mtime, size) of
+    the snapshot and (inode, size) of the journal, None if missing.
+    The snapshot is replaced (new inode) on each write and the journal only
+    grows, so a change of state means another process wrote them
+    """
+    try:
+        stat = os.stat(".db_{}.json".format(s_class))
+        snapshot = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        snapshot = None
+    try:
+        stat = os.stat(".db_{}.journal".format(s_class))
+        journal = (stat.st_ino, stat.st_size)
+    except FileNotFoundError:
+        journal = None
+    return snapshot, journal
+
+
+def _replayed_state(state: Tuple[Any, Any],
+                    journal_end: Union[int, None]) -> Tuple[Any, Any]:
+    """ Return the state of the files of a class once its journal was
+    replayed up to `journal_end`: a torn record at the end of the journal is
+    not counted, the next record is appended in its place
+    """
+    snapshot, journal = state
+    if journal is not None and journal_end is not None:
+        journal = (journal[0], min(journal[1], journal_end))
+    return snapshot, journal
+
+
+def _truncate_torn_record(f: BinaryIO):
+    """ Truncate a journal opened in `a+b` mode after its last complete
+    record (terminated by a newline)
+    """
+    size = f.seek(0, os.SEEK_END)
+    end = size
+    while end > 0:
+        start = max(end - 4096, 0)
+        f.seek(start)
+        newline = f.read(end - start).rfind(b"\n")
+        if newline != -1:
+            end = start + newline + 1
+            break
+        end = start
+    if end < size:
+        f.truncate(end)
+
+
+@contextmanager
+def _file_lock(s_class: str, exclusive: bool = False) -> Iterator[None]:
+    """ Hold the lock on the files of a class, shared between processes
+    (`fcntl.flock` on `.db_<Class>.lock`) in multi-process mode.
+    A thread already holding the lock of the class doesn't take it again
+    """
+    held = getattr(_HELD_LOCKS, 'classes', None)
+    if held is None:
+        held = _HELD_LOCKS.classes = set()
+    if not MULTIPROCESS or s_class in held:
+        yield
+        return
+
+    with open(".db_{}.lock".format(s_class), 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        held.add(s_class)
+        try:
+            yield
+        finally:
+            held.discard(s_class)
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _write_atomic(file_path: str, objs_json: dict, sync: bool = False):
+    """ Write a snapshot to a temporary file renamed over `file_path`,
+    readers never see a partially written file.
+    With `sync`, the file and its directory are fsynced.
+    The file keeps the mode of the file it replaces
+    """
+    dir_path = path.dirname(path.abspath(file_path))
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(prefix=path.basename(file_path) + '.',
+                                    suffix='.tmp', dir=dir_path)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            # `mkstemp` creates the file as 0600
+            os.fchmod(f.fileno(), mode)
+            json.dump(objs_json, f)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if path.exists(tmp_path):
+            remove(tmp_path)
+        raise
+
+    if sync:
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def flush_all():
+    """ Flush every class with unflushed mutations
+    """
+    with _PENDING_LOCK:
+        dirty = [DIRTY_CLASSES[s_class] for s_class in PENDING]
+    for cls in dirty:
+        cls.flush()
+
+
+def _run_flusher():
+    """ Flush the dirty classes every `FLUSH_INTERVAL_MS`
+    """
+    while True:
+        time.sleep(FLUSH_INTERVAL_MS / 1000)
+        flush_all()
+
+
+def _start_flusher():
+    """ Start the flusher thread once
+    """
+    global _FLUSHER
+    if _FLUSHER is not None:
+        return
+    with _PENDING_LOCK:
+        if _FLUSHER is None:
+            _FLUSHER = threading.Thread(target=_run_flusher, daemon=True)
+            _FLUSHER.start()
+
+
+atexit.register(flush_all)
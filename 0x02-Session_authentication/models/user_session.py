@@ -7,6 +7,8 @@ from models.base import Base
 class UserSession(Base):
     """ UserSession class
     """
+    __slots__ = ('user_id', 'session_id', 'last_seen', 'ttl', 'expires_at')
+    _indexed_attributes = ('session_id',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a UserSession instance
@@ -14,3 +16,7 @@ class UserSession(Base):
         super().__init__(*args, **kwargs)
         self.user_id = kwargs.get('user_id')
         self.session_id = kwargs.get('session_id')
+        # timestamps (seconds since the epoch) and time to live in seconds
+        self.last_seen = kwargs.get('last_seen')
+        self.ttl = kwargs.get('ttl')
+        self.expires_at = kwargs.get('expires_at')
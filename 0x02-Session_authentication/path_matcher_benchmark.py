@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+""" Micro-benchmark of `Auth.require_auth`: the excluded paths compiled once
+by `PathMatcher`, against a `re.match` per excluded path on each call (the
+loop before the matcher), as the list of excluded paths grows.
+
+Usage: ./path_matcher_benchmark.py [sizes of the list (default 4 32 256)]
+"""
+import os
+import re
+import sys
+import timeit
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from api.v1.auth.auth import PathMatcher  # noqa: E402
+
+
+def require_auth_loop(path: str, excluded_paths: List[str]) -> bool:
+    """ `Auth.require_auth` before `PathMatcher`
+    """
+    if path is None:
+        return True
+    if excluded_paths is None or len(excluded_paths) == 0:
+        return True
+    if path[-1] != '/':
+        path = path + '/'
+    for ex_path in excluded_paths:
+        if re.match(ex_path, path):
+            return False
+    return True
+
+
+def excluded_paths_of(size: int) -> List[str]:
+    """ `size` excluded paths: the paths of the app, then literal paths and
+    `*` patterns
+    """
+    paths = ['/api/v1/stat*', '/api/v1/unauthorized/', '/api/v1/forbidden/',
+             '/api/v1/auth_session/login/']
+    i = 0
+    while len(paths) < size:
+        paths.append('/api/v1/public{}/'.format(i))
+        paths.append('/api/v1/assets{}/*'.format(i))
+        i += 1
+    return paths[:size]
+
+
+def main(sizes: List[int]):
+    """ Print the time per call of both implementations for each size
+    """
+    # an authenticated path goes through the whole list
+    paths = ['/api/v1/users', '/api/v1/status', '/api/v1/forbidden',
+             '/api/v1/assets1/logo.png', '/api/v1/public10']
+    number = 20000
+    print("{:>6} {:>12} {:>12} {:>8}".format("paths", "re.match", "matcher",
+                                             "speedup"))
+    for size in sizes:
+        excluded_paths = excluded_paths_of(size)
+        matcher = PathMatcher(excluded_paths)
+        for path in paths:
+            assert matcher.requires_auth(path) == \
+                require_auth_loop(path, excluded_paths), path
+
+        loop = min(timeit.repeat(
+            lambda: require_auth_loop('/api/v1/users', excluded_paths),
+            number=number, repeat=5)) / number
+        compiled = min(timeit.repeat(
+            lambda: matcher.requires_auth('/api/v1/users'),
+            number=number, repeat=5)) / number
+        print("{:>6} {:>10.2f}us {:>10.2f}us {:>7.0f}x".format(
+            size, loop * 1e6, compiled * 1e6, loop / compiled))
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [4, 32, 256])
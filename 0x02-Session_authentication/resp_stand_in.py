@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+""" Local stand-in for a Redis protocol (RESP) server, to run the `resp`
+session store without a Redis server.
+
+It keeps the keys in memory and answers the commands the store sends:
+`PING`, `AUTH`, `SELECT`, `SET` (with `EX`/`PX` and `NX`/`XX`), `GET`,
+`DEL`, `EXISTS`, `PTTL` and `FLUSHDB`. Keys with a time to live expire
+like in Redis.
+
+Usage: ./resp_stand_in.py [port (default 6379)] [password]
+"""
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple, Union
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """ In-memory RESP server, one thread by connection
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ('127.0.0.1', 0),
+                 password: Union[str, None] = None):
+        """ Listen on `address` (port 0: any free port)
+        """
+        super().__init__(address, RespHandler)
+        self.password = password
+        # {db: {key: (value, expiration time or None)}}
+        self.dbs = {}
+        self.lock = threading.Lock()
+        # number of commands received, by name
+        self.commands = {}
+
+    @property
+    def url(self) -> str:
+        """ URL of the server, for `RespSessionStore`
+        """
+        host, port = self.server_address[:2]
+        if self.password is None:
+            return 'redis://{}:{}/0'.format(host, port)
+        return 'redis://:{}@{}:{}/0'.format(self.password, host, port)
+
+    def start(self) -> 'RespStandIn':
+        """ Serve from a background thread
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def keys(self, db: int) -> Dict[bytes, Tuple[bytes, Any]]:
+        """ Keys of a database, without the expired ones
+        """
+        keys = self.dbs.setdefault(db, {})
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in keys.items()
+                    if expires_at is not None and expires_at <= now]:
+            del keys[key]
+        return keys
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """ Connection to the stand-in server
+    """
+
+    def handle(self):
+        """ Answer the commands of the connection until it is closed
+        """
+        self.db = 0
+        self.authenticated = self.server.password is None
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self.run(args))
+
+    def read_command(self) -> Union[List[bytes], None]:
+        """ Read a command (an array of bulk strings), None at the end of
+        the connection
+        """
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if line[:1] != b'*':
+            # inline command
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = self.rfile.readline()
+            if size[:1] != b'$':
+                raise ValueError("expected a bulk string")
+            args.append(self.rfile.read(int(size[1:-2]) + 2)[:-2])
+        return args
+
+    def run(self, args: List[bytes]) -> bytes:
+        """ Run a command, return the encoded reply
+        """
+        if len(args) == 0:
+            return error("ERR empty command")
+        name = args[0].decode('utf-8').upper()
+        server = self.server
+        with server.lock:
+            server.commands[name] = server.commands.get(name, 0) + 1
+            if name == 'AUTH':
+                if len(args) == 2 \
+                        and args[1].decode('utf-8') == server.password:
+                    self.authenticated = True
+                    return b'+OK\r\n'
+                return error("WRONGPASS invalid password")
+            if not self.authenticated:
+                return error("NOAUTH Authentication required.")
+            if name == 'PING':
+                return b'+PONG\r\n'
+            if name == 'SELECT':
+                self.db = int(args[1])
+                return b'+OK\r\n'
+            keys = server.keys(self.db)
+            if name == 'SET':
+                return self.set(keys, args[1:])
+            if name == 'GET':
+                value = keys.get(args[1])
+                return bulk(value[0] if value is not None else None)
+            if name == 'DEL':
+                return integer(sum(keys.pop(key, None) is not None
+                                   for key in args[1:]))
+            if name == 'EXISTS':
+                return integer(sum(key in keys for key in args[1:]))
+            if name == 'PTTL':
+                if args[1] not in keys:
+                    return integer(-2)
+                expires_at = keys[args[1]][1]
+                if expires_at is None:
+                    return integer(-1)
+                return integer(int((expires_at - time.monotonic()) * 1000))
+            if name == 'FLUSHDB':
+                keys.clear()
+                return b'+OK\r\n'
+        return error("ERR unknown command '{}'".format(name))
+
+    @staticmethod
+    def set(keys: Dict[bytes, Tuple[bytes, Any]], args: List[bytes]
+            ) -> bytes:
+        """ `SET key value [EX seconds | PX milliseconds] [NX | XX]`, a nil
+        reply if the key is set with `NX` or not set with `XX`
+        """
+        if len(args) < 2:
+            return error("ERR syntax error")
+        expires_at = None
+        condition = None
+        options = [arg.upper() for arg in args[2:]]
+        i = 0
+        while i < len(options):
+            if options[i] in (b'EX', b'PX') and expires_at is None \
+                    and i + 1 < len(options):
+                if int(options[i + 1]) <= 0:
+                    return error("ERR invalid expire time in 'set' command")
+                ttl = int(options[i + 1]) / (1 if options[i] == b'EX'
+                                             else 1000)
+                expires_at = time.monotonic() + ttl
+                i += 2
+            elif options[i] in (b'NX', b'XX') and condition is None:
+                condition = options[i]
+                i += 1
+            else:
+                return error("ERR syntax error")
+        if condition == b'NX' and args[0] in keys \
+                or condition == b'XX' and args[0] not in keys:
+            return bulk(None)
+        keys[args[0]] = (args[1], expires_at)
+        return b'+OK\r\n'
+
+
+def bulk(value: Union[bytes, None]) -> bytes:
+    """ Encode a bulk string reply
+    """
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def integer(value: int) -> bytes:
+    """ Encode an integer reply
+    """
+    return b':%d\r\n' % value
+
+
+def error(message: str) -> bytes:
+    """ Encode an error reply
+    """
+    return b'-%s\r\n' % message.encode('utf-8')
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    password = sys.argv[2] if len(sys.argv) > 2 else None
+    server = RespStandIn(('127.0.0.1', port), password)
+    print("RESP stand-in listening on {}".format(server.url))
+    server.serve_forever()
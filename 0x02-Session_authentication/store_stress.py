@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+""" Stress test of the model store under threads: many threads run
+concurrent `save`, `remove`, `search`, `all`, `page`, `get` and `count`
+calls, in each storage mode. It fails on any error raised by a thread
+(e.g. "dictionary changed size during iteration"), and if the objects or
+the indexes in memory, or the file reloaded, don't match the saved
+objects.
+
+Usage: ./store_stress.py [threads (default 8)] [operations per thread
+(default 300)]
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from typing import Dict, List
+
+# environment of each storage mode
+MODES = {
+    'snapshot': {},
+    'journal': {'STORE_MODE': 'journal', 'STORE_JOURNAL_COMPACT': '50'},
+    'write_behind': {'STORE_MODE': 'write_behind',
+                     'STORE_FLUSH_INTERVAL_MS': '5'},
+    'lazy_load': {'STORE_LAZY_LOAD': '1'},
+    'multiprocess': {'STORE_MULTIPROCESS': '1', 'STORE_MODE': 'journal'},
+}
+
+
+def worker(n: int, operations: int, saved: Dict[str, str],
+           errors: List[str]):
+    """ Run `operations` random operations, record the objects left saved
+    by this thread in `saved` (id -> email)
+    """
+    from models.user import User
+
+    rand = random.Random(n)
+    mine = []
+    try:
+        for i in range(operations):
+            op = rand.random()
+            if op < 0.4 or len(mine) == 0:
+                user = User(email='t{}-{}@stress'.format(n, i))
+                user.first_name = str(i)
+                user.save()
+                mine.append(user)
+            elif op < 0.55:
+                user = mine.pop(rand.randrange(len(mine)))
+                user.remove()
+            elif op < 0.65:
+                user = rand.choice(mine)
+                user.first_name = 'updated'
+                user.save()
+            elif op < 0.75:
+                user = rand.choice(mine)
+                found = User.search({'email': user.email})
+                if [u.id for u in found] != [user.id]:
+                    errors.append("search {} returned {}".format(
+                        user.email, [u.id for u in found]))
+            elif op < 0.85:
+                for user in User.all():
+                    user.to_json()
+            elif op < 0.9:
+                User.page(20, rand.choice(mine).id)
+            elif op < 0.95:
+                user = rand.choice(mine)
+                if User.get(user.id) is None:
+                    errors.append("get {} missed".format(user.id))
+            else:
+                User.count()
+    except Exception:
+        errors.append(traceback.format_exc())
+    for user in mine:
+        saved[user.id] = user.email
+
+
+def check(saved: Dict[str, str], errors: List[str]):
+    """ Check the store against the objects saved by the threads
+    """
+    from models.base import flush_all
+    from models.user import User
+
+    if User.count() != len(saved):
+        errors.append("{} objects in memory, {} saved".format(
+            User.count(), len(saved)))
+    for obj_id, email in saved.items():
+        if [u.id for u in User.search({'email': email})] != [obj_id]:
+            errors.append("index of {} is wrong".format(email))
+    flush_all()
+    User.load_from_file()
+    reloaded = {user.id: user.email for user in User.all()}
+    if reloaded != saved:
+        errors.append("{} objects reloaded, {} saved".format(
+            len(reloaded), len(saved)))
+
+
+def run(threads: int, operations: int) -> int:
+    """ Run the threads in the storage mode of the environment, return the
+    number of errors
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # many thread switches, to interleave the operations
+    sys.setswitchinterval(1e-6)
+    from models.user import User
+
+    User.load_from_file()
+    # objects already in the file, decoded on first access in lazy mode
+    saved = {}
+    for i in range(200):
+        user = User(email='seed-{}@stress'.format(i))
+        user.save()
+        saved[user.id] = user.email
+    User.load_from_file()
+    errors = []
+    workers = [threading.Thread(target=worker,
+                                args=(n, operations, saved, errors))
+               for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    sys.setswitchinterval(0.005)
+    check(saved, errors)
+    for error in errors:
+        print(error)
+    print("{} objects saved, {} errors".format(len(saved), len(errors)))
+    return len(errors)
+
+
+def main(threads: int, operations: int) -> int:
+    """ Run the stress test in each storage mode, each in its own process
+    and directory. Return the number of failed modes
+    """
+    failed = 0
+    for mode, env in MODES.items():
+        print("{}: {} threads x {} operations".format(
+            mode, threads, operations))
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run',
+             str(threads), str(operations)],
+            cwd=tempfile.mkdtemp(), env=dict(os.environ, **env))
+        if result.returncode != 0:
+            failed += 1
+    print("{} failed mode(s)".format(failed))
+    return failed
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) > 0 and args[0] == '--run':
+        sys.exit(1 if run(int(args[1]), int(args[2])) > 0 else 0)
+    sys.exit(1 if main(int(args[0]) if len(args) > 0 else 8,
+                       int(args[1]) if len(args) > 1 else 300) > 0 else 0)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+""" Checks that the user of a request is resolved once per request: the
+credential pipeline (Basic auth header decoding, user search and password
+hash) runs once, however many times the user is needed.
+
+Usage: python3 -m unittest test_request_user
+"""
+import base64
+import os
+import sys
+import tempfile
+import unittest
+
+# the app is configured when imported, and keeps its files in the current
+# directory
+os.environ['AUTH_TYPE'] = 'basic_auth'
+os.chdir(tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.v1.app import app, auth  # noqa: E402
+from flask import request  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+class TestRequestUser(unittest.TestCase):
+    """ Counts the calls of the credential pipeline of `BasicAuth`
+    """
+
+    def setUp(self):
+        """ Create a user and count the pipeline calls
+        """
+        self.user = User(email='bob@hbtn.io')
+        self.user.password = 'H0lberton:School:98!'
+        self.user.save()
+        self.header = 'Basic ' + base64.b64encode(
+            b'bob@hbtn.io:H0lberton:School:98!').decode('ascii')
+        self.calls = {'current_user': 0, 'decode': 0, 'search': 0,
+                      'password': 0}
+        self.patch(auth, 'current_user', 'current_user')
+        self.patch(auth, 'decode_base64_authorization_header', 'decode')
+        self.patch(auth, 'user_object_from_credentials', 'search')
+        self.patch(User, 'is_valid_password', 'password')
+        self.client = app.test_client()
+
+    def patch(self, owner: object, name: str, counter: str):
+        """ Count the calls of `owner.name` in `self.calls[counter]`
+        """
+        original = getattr(owner, name)
+
+        def counted(*args, **kwargs):
+            self.calls[counter] += 1
+            return original(*args, **kwargs)
+
+        setattr(owner, name, counted)
+        if isinstance(owner, type):
+            self.addCleanup(setattr, owner, name, original)
+        else:
+            self.addCleanup(delattr, owner, name)
+
+    def get(self, path: str):
+        """ Request `path` with the Basic auth header of the user, the
+        cache of verified headers is emptied first so the whole pipeline
+        runs
+        """
+        auth.credentials_cache.clear()
+        return self.client.get(path, headers={'Authorization': self.header})
+
+    def test_once_per_request(self):
+        """ Each request runs the pipeline once
+        """
+        for i in range(3):
+            self.assertEqual(self.get('/api/v1/users').status_code, 200)
+        self.assertEqual(self.calls, {'current_user': 3, 'decode': 3,
+                                      'search': 3, 'password': 3})
+
+    def test_reused_in_request(self):
+        """ The user asked again during the request is not resolved again
+        """
+        auth.credentials_cache.clear()
+        with app.test_request_context(
+                '/api/v1/users', headers={'Authorization': self.header}):
+            app.preprocess_request()
+            user = auth.request_user(request)
+            self.assertEqual(user.email, 'bob@hbtn.io')
+            self.assertIs(auth.request_user(request), user)
+        self.assertEqual(self.calls['current_user'], 1)
+        self.assertEqual(self.calls['password'], 1)
+
+    def test_wrong_password(self):
+        """ A rejected request runs the pipeline once too
+        """
+        self.header = 'Basic ' + base64.b64encode(
+            b'bob@hbtn.io:wrong').decode('ascii')
+        self.assertEqual(self.get('/api/v1/users').status_code, 403)
+        self.assertEqual(self.calls, {'current_user': 1, 'decode': 1,
+                                      'search': 1, 'password': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+""" Checks the `resp` session store against the local stand-in server of
+`resp_stand_in.py`.
+
+Usage: python3 -m unittest test_resp_session_store
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+# the models keep their files in the current directory
+os.chdir(tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.v1.auth.session_auth import SessionAuth  # noqa: E402
+from api.v1.auth.session_exp_auth import SessionExpAuth  # noqa: E402
+from api.v1.auth.session_store import (RespSessionStore,  # noqa: E402
+                                       SessionStoreError)
+from resp_stand_in import RespStandIn  # noqa: E402
+
+
+class TestRespSessionStore(unittest.TestCase):
+    """ `RespSessionStore` on a stand-in server
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """ Start the stand-in server
+        """
+        cls.server = RespStandIn().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """ Stop the stand-in server
+        """
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """ Empty the server and connect a new store
+        """
+        self.server.dbs.clear()
+        self.store = RespSessionStore(self.server.url)
+        self.addCleanup(self.store._close)
+
+    def test_set_get_delete(self):
+        """ A session is stored, read back and deleted
+        """
+        record = {"user_id": "u1", "created_at": 1.5, "last_seen": None}
+        self.store.set("s1", record)
+        self.assertEqual(self.store.get("s1"), record)
+        self.assertIsNone(self.store.get("s2"))
+        self.assertTrue(self.store.delete("s1"))
+        self.assertFalse(self.store.delete("s1"))
+        self.assertIsNone(self.store.get("s1"))
+
+    def test_ttl(self):
+        """ The server expires the sessions with a time to live
+        """
+        self.store.set("s1", {"user_id": "u1"}, ttl=0.2)
+        self.store.set("s2", {"user_id": "u2"})
+        self.assertIsNotNone(self.store.get("s1"))
+        time.sleep(0.3)
+        self.assertIsNone(self.store.get("s1"))
+        self.assertIsNotNone(self.store.get("s2"))
+        self.assertFalse(self.store.touch("s1"))
+        self.assertEqual(self.store.reap(), 0)
+
+    def test_touch(self):
+        """ touch sets `last_seen` and pushes back the expiration
+        """
+        self.store.set("s1", {"user_id": "u1", "last_seen": None}, ttl=0.3)
+        time.sleep(0.2)
+        self.assertTrue(self.store.touch("s1"))
+        last_seen = self.store.get("s1")["last_seen"]
+        self.assertAlmostEqual(last_seen, time.time(), delta=1)
+        time.sleep(0.2)
+        self.assertIsNotNone(self.store.get("s1"))
+
+    def test_expire(self):
+        """ expire sets or removes the time to live
+        """
+        self.store.set("s1", {"user_id": "u1"}, ttl=0.2)
+        self.assertTrue(self.store.expire("s1", 0))
+        time.sleep(0.3)
+        self.assertIsNotNone(self.store.get("s1"))
+        self.assertTrue(self.store.expire("s1", 0.1))
+        time.sleep(0.2)
+        self.assertIsNone(self.store.get("s1"))
+        self.assertFalse(self.store.expire("s1", 10))
+
+    def test_set_conditions(self):
+        """ `SET ... XX` only replaces a key, `SET ... NX` only creates one
+        """
+        self.assertIsNone(self.store.command('SET', 'k', 'v1', 'XX'))
+        self.assertIsNone(self.store.command('GET', 'k'))
+        self.assertEqual(self.store.command('SET', 'k', 'v1', 'NX'), 'OK')
+        self.assertIsNone(self.store.command('SET', 'k', 'v2', 'NX'))
+        self.assertEqual(self.store.command('SET', 'k', 'v3', 'PX', 5000,
+                                            'XX'), 'OK')
+        self.assertEqual(self.store.command('GET', 'k'), b'v3')
+        self.assertGreater(self.store.command('PTTL', 'k'), 0)
+
+    def test_touch_after_logout(self):
+        """ A session deleted by another worker while it is touched or
+        re-armed is not recreated
+        """
+        other = RespSessionStore(self.server.url)
+        self.addCleanup(other._close)
+        get = self.store._get
+
+        def get_then_logout(session_id):
+            """ The other worker deletes the session after the read """
+            value = get(session_id)
+            other.delete(session_id)
+            return value
+
+        for update in (self.store.touch,
+                       lambda session_id: self.store.expire(session_id, 60)):
+            self.store.set("s1", {"user_id": "u1"}, ttl=60)
+            with mock.patch.object(self.store, '_get', get_then_logout):
+                self.assertFalse(update("s1"))
+            self.assertIsNone(self.store.get("s1"))
+            self.assertIsNone(other.get("s1"))
+
+    def test_reconnect(self):
+        """ A lost connection is opened again
+        """
+        self.store.set("s1", {"user_id": "u1"})
+        self.store._local.sock.close()
+        self.assertEqual(self.store.get("s1"), {"user_id": "u1"})
+
+    def test_shared(self):
+        """ Two stores (two workers) see the same sessions
+        """
+        other = RespSessionStore(self.server.url)
+        self.addCleanup(other._close)
+        self.store.set("s1", {"user_id": "u1"})
+        self.assertEqual(other.get("s1"), {"user_id": "u1"})
+        other.delete("s1")
+        self.assertIsNone(self.store.get("s1"))
+
+    def test_password_and_db(self):
+        """ The password and the database of the URL are used
+        """
+        server = RespStandIn(password='secret').start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        store = RespSessionStore(server.url.replace('/0', '/2'))
+        self.addCleanup(store._close)
+        store.set("s1", {"user_id": "u1"})
+        self.assertIn(b'session:s1', server.dbs[2])
+        wrong = RespSessionStore(server.url.replace(':secret@', ':wrong@'))
+        self.addCleanup(wrong._close)
+        with self.assertRaises(SessionStoreError):
+            wrong.get("s1")
+
+    def test_session_auth(self):
+        """ The session auth types keep their sessions in the `resp` store
+        """
+        env = {'SESSION_STORE': 'resp', 'SESSION_STORE_URL': self.server.url,
+               'SESSION_DURATION': '60'}
+        with mock.patch.dict(os.environ, env):
+            auth = SessionAuth()
+            exp_auth = SessionExpAuth()
+        self.addCleanup(auth.session_store._close)
+        self.addCleanup(exp_auth.session_store._close)
+        session_id = auth.create_session("u1")
+        self.assertEqual(auth.user_id_for_session_id(session_id), "u1")
+        self.assertEqual(exp_auth.user_id_for_session_id(session_id), "u1")
+        session_id = exp_auth.create_session("u2")
+        self.assertEqual(exp_auth.user_id_for_session_id(session_id), "u2")
+        self.assertGreater(self.server.dbs[0][
+            'session:{}'.format(session_id).encode()][1] - time.monotonic(),
+            50)
+
+
+if __name__ == '__main__':
+    unittest.main()
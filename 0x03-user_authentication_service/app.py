@@ -3,6 +3,7 @@
 Application module
 """
 from auth import Auth
+from hashing import HashingBusyError, HashingTimeoutError
 from flask import (
     abort,
     Flask,
@@ -18,6 +19,23 @@ app.url_map.strict_slashes = False
 AUTH = Auth()
 
 
+@app.teardown_appcontext
+def close_db_session(exception=None) -> None:
+    """releases the database session of the request"""
+    AUTH.close()
+
+
+@app.errorhandler(HashingBusyError)
+@app.errorhandler(HashingTimeoutError)
+def hashing_unavailable(error) -> str:
+    """
+    The password hashing workers are saturated: 503, retry later
+    """
+    resp = make_response(jsonify({"message": "service unavailable"}), 503)
+    resp.headers['Retry-After'] = '1'
+    return resp
+
+
 @app.route('/', methods=['GET'])
 def get_message() -> str:
     """A simple GET / route"""
@@ -82,12 +100,13 @@ def logout() -> str:
     # get `session_id` cookie
     session_id = request.cookies.get('session_id')
 
-    # get user by session id
-    user = AUTH.get_user_from_session_id(session_id)
-    if user is None:
+    # get the session, without loading the user
+    user_session = AUTH.get_session(session_id)
+    if user_session is None:
         abort(403)
-    # remove user's session id from storage
-    AUTH.destroy_session(user.id)
+    # remove the session from storage, the other sessions of the user
+    # are kept
+    AUTH.destroy_session(user_session.user_id, session_id)
 
     # redirect to home '/'
     return redirect(url_for('app.get_message'))
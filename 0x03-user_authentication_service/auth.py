@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 """Hash passwords"""
 import bcrypt
+from datetime import datetime, timedelta
 from db import DB
-from sqlalchemy.exc import InvalidRequestError
+from hashing import (HashingBusyError, HashingTimeoutError, bcrypt_rounds,
+                     hashing_pool, needs_rehash)
+import os
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
 import uuid
 from typing import TypeVar, Union
@@ -15,13 +19,26 @@ class Auth:
     def __init__(self):
         """Instantiation method"""
         self._db = DB()
+        # the cost of the hashes is calibrated now if `auto`
+        bcrypt_rounds()
+        # lifetime of the sessions in seconds, 0: they never expire
+        try:
+            self.session_duration = int(os.getenv('SESSION_DURATION', '0'))
+        except ValueError:
+            self.session_duration = 0
+
+    def close(self) -> None:
+        """releases the database session of the current thread"""
+        self._db.close()
 
     def _hash_password(self, password: str) -> bytes:
         """returns a hashed string of a password"""
         # convert sting to bytes
         encoded = password.encode('utf-8')
 
-        hashed = bcrypt.hashpw(encoded, bcrypt.gensalt())
+        # on the bounded pool of bcrypt workers
+        hashed = hashing_pool().hashpw(encoded,
+                                       bcrypt.gensalt(bcrypt_rounds()))
         return hashed
 
     def register_user(self, email: str, password: str) -> TypeVar('User'):
@@ -37,7 +54,10 @@ class Auth:
         except NoResultFound:
             # hash password and save to storage
             hashed_pwd = self._hash_password(password)
-            new_user = self._db.add_user(email, hashed_pwd)
+            try:
+                new_user = self._db.add_user(email, hashed_pwd)
+            except IntegrityError:
+                raise ValueError('User {} already exists'.format(email))
 
         return new_user
 
@@ -54,7 +74,18 @@ class Auth:
         # convert sting to bytes
         encoded = password.encode('utf-8')
 
-        return bcrypt.checkpw(encoded, user.hashed_password)
+        if not hashing_pool().checkpw(encoded, user.hashed_password):
+            return False
+
+        # the hash of an older cost is replaced by one of the current cost
+        if needs_rehash(user.hashed_password):
+            try:
+                self._db.update_user(
+                    user.id, hashed_password=self._hash_password(password))
+            except (HashingBusyError, HashingTimeoutError):
+                # done on a later login
+                pass
+        return True
 
     def _generate_uuid(self) -> str:
         """Generate a uuid"""
@@ -64,28 +95,51 @@ class Auth:
         """
         creates a new session id for a user
         """
+        # generate a session id
+        session_id = self._generate_uuid()
+
+        expires_at = None
+        if self.session_duration > 0:
+            expires_at = datetime.utcnow() + \
+                timedelta(seconds=self.session_duration)
+        # the session is added to the user with this email, if any
         try:
-            user = self._db.find_user_by(email=email)
-            # generate a session id
-            session_id = self._generate_uuid()
-
-            self._db.update_user(user.id, session_id=session_id)
-        except (NoResultFound, ValueError):
+            if not self._db.add_session(session_id, expires_at, email=email):
+                return None
+        except ValueError:
             return None
 
         return session_id
 
-    def destroy_session(self, user_id: int) -> None:
+    def destroy_session(self, user_id: int,
+                        session_id: Union[str, None] = None) -> None:
+        """
+        removes the session `session_id` of a user, or all its sessions
+        """
+        self._db.remove_sessions(user_id, session_id)
+
+        return None
+
+    def get_session(self,
+                    session_id: str) -> Union[None, TypeVar('UserSession')]:
         """
-        removes a session id from user
+        get a session by id, None if missing or expired.
+        Its user is only loaded when `user` is accessed
         """
+        if session_id is None:
+            return None
+
         try:
-            user = self._db.find_user_by(id=user_id)
+            user_session = self._db.find_session(session_id)
         except NoResultFound:
-            raise
-        self._db.update_user(user.id, session_id=None)
+            return None
 
-        return None
+        if user_session.expires_at is not None \
+                and user_session.expires_at < datetime.utcnow():
+            self._db.remove_sessions(user_session.user_id, session_id)
+            return None
+
+        return user_session
 
     def get_user_from_session_id(self,
                                  session_id: str
@@ -93,28 +147,22 @@ class Auth:
         """
         get user by session id
         """
-        if session_id is None:
+        user_session = self.get_session(session_id)
+        if user_session is None:
             return None
 
-        try:
-            user = self._db.find_user_by(session_id=session_id)
-        except (NoResultFound, ValueError):
-            return None
-
-        return user
+        return user_session.user
 
     def get_reset_password_token(self, email: str) -> str:
         """
         Generate password reset token for a user
         """
-        try:
-            user = self._db.find_user_by(email=email)
-        except NoResultFound:
-            raise ValueError
         reset_token = str(uuid.uuid4())
 
         # update user's reset_token field
-        self._db.update_user(user.id, reset_token=reset_token)
+        if not self._db.update_user_by({"email": email},
+                                       reset_token=reset_token):
+            raise ValueError
 
         return reset_token
 
@@ -124,18 +172,27 @@ class Auth:
         """
         if reset_token is None or password is None:
             raise ValueError
-
+        # tokens are uuids, anything else can't match and isn't worth
+        # hashing the password
+        try:
+            uuid.UUID(reset_token)
+        except ValueError:
+            raise ValueError
+        # an unknown token costs an indexed read, not a bcrypt hash
         try:
-            user = self._db.find_user_by(reset_token=reset_token)
+            self._db.find_user_by(reset_token=reset_token)
         except NoResultFound:
             raise ValueError
 
         # hash user's new password
         hashed_password = self._hash_password(password)
-        # update fields
+        # update fields of the user with this token, if it wasn't used
+        # meanwhile
         kwargs = {
             "hashed_password": hashed_password,
             "reset_token": None
         }
-        self._db.update_user(user.id, **kwargs)
+        if not self._db.update_user_by({"reset_token": reset_token},
+                                       **kwargs):
+            raise ValueError
         return None
@@ -1,14 +1,82 @@
 """DB module
 """
-from sqlalchemy import create_engine
+from functools import lru_cache
+from os import getenv
+from sqlalchemy import (and_, bindparam, create_engine, event, inspect,
+                        literal)
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext import baked
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.sql import select
 from sqlalchemy.orm.session import Session
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
-from typing import Mapping, Tuple, TypeVar
+from sqlalchemy.pool import QueuePool, StaticPool
+from datetime import datetime
+from typing import FrozenSet, Mapping, Tuple, TypeVar, Union
 
 from user import Base, User
+from user_session import UserSession
+
+
+# URL of the database
+DB_URL = getenv('DB_URL', 'sqlite:///a.db')
+# `1` to drop the tables on start, they are only created if missing
+DB_RESET = getenv('DB_RESET', '0') == '1'
+# connection pool: connections kept open, extra connections allowed under
+# load, seconds to wait for a connection, and seconds before a connection
+# is recycled (-1: never)
+DB_POOL_SIZE = int(getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(getenv('DB_POOL_RECYCLE', '-1'))
+
+
+@lru_cache(maxsize=None)
+def columns_of(model: type) -> FrozenSet[str]:
+    """
+    Returns the names of the columns of the table of a model
+    """
+    return frozenset(model.__table__.columns.keys())
+
+
+def make_engine(url: str = DB_URL) -> Engine:
+    """
+    Creates the engine of a database, with a pool of connections.
+    SQLite connections are shared between threads (one at a time, through
+    the pool) and file databases use the WAL journal, so readers don't
+    block the writer
+    """
+    if not url.startswith('sqlite'):
+        return create_engine(url, pool_size=DB_POOL_SIZE,
+                             max_overflow=DB_MAX_OVERFLOW,
+                             pool_timeout=DB_POOL_TIMEOUT,
+                             pool_recycle=DB_POOL_RECYCLE,
+                             pool_pre_ping=True)
+
+    connect_args = {"check_same_thread": False}
+    if url in ('sqlite://', 'sqlite:///:memory:'):
+        # a single connection holds the in-memory database
+        return create_engine(url, connect_args=connect_args,
+                             poolclass=StaticPool)
+
+    engine = create_engine(url, connect_args=connect_args,
+                           poolclass=QueuePool, pool_size=DB_POOL_SIZE,
+                           max_overflow=DB_MAX_OVERFLOW,
+                           pool_timeout=DB_POOL_TIMEOUT,
+                           pool_recycle=DB_POOL_RECYCLE)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """sets the journal of each new connection"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    return engine
 
 
 class DB:
@@ -18,19 +86,48 @@ class DB:
     def __init__(self) -> None:
         """Initialize a new DB instance
         """
-        self._engine = create_engine("sqlite:///a.db")
-        Base.metadata.drop_all(self._engine)
+        self._engine = make_engine()
+        if DB_RESET:
+            Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        self._create_indexes()
+        # queries of `find_user_by`, compiled once by set of attributes
+        self._bakery = baked.bakery()
+        # one session by thread, released by `close` at the end of
+        # each request
+        self.__sessions = scoped_session(sessionmaker(bind=self._engine))
+
+    def _create_indexes(self) -> None:
+        """
+        Creates the indexes missing from the tables of an existing database.
+        An unique index that can't be created because of duplicated values
+        is created as a plain index
+        """
+        inspector = inspect(self._engine)
+        for table in Base.metadata.sorted_tables:
+            existing = {index['name']
+                        for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                try:
+                    index.create(self._engine)
+                except IntegrityError:
+                    self._engine.execute('CREATE INDEX {} ON {} ({})'.format(
+                        index.name, table.name,
+                        ', '.join(column.name for column in index.columns)))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session of the current thread
+        """
+        return self.__sessions()
+
+    def close(self) -> None:
+        """
+        Releases the session of the current thread, and its connection
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__sessions.remove()
 
     def add_user(self, email: str, hashed_password: str) -> TypeVar('User'):
         """
@@ -42,7 +139,12 @@ class DB:
         }
         new_user = User(**new_dict)
         self._session.add(new_user)
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            # the email was registered meanwhile
+            self._session.rollback()
+            raise
 
         return new_user
 
@@ -51,8 +153,18 @@ class DB:
         finds a user by using arbitary key-value args
         """
         try:
-            user_obj = self._session.query(
-                User).filter_by(**kwargs).first()
+            if list(kwargs) == ['id']:
+                # from the identity map of the session, without a query
+                # if the user is already loaded
+                user_obj = self._baked_query(())(self._session).get(
+                    kwargs['id'])
+            elif None in kwargs.values():
+                user_obj = self._session.query(
+                    User).filter_by(**kwargs).first()
+            else:
+                user_obj = self._baked_query(
+                    tuple(sorted(kwargs)))(self._session).params(
+                        **kwargs).first()
 
             # raise Not Found Error
             if user_obj is None:
@@ -61,16 +173,108 @@ class DB:
             raise
         return user_obj
 
-    def update_user(self, user_id: int, **kwargs: Mapping) -> None:
+    def _baked_query(self, keys: Tuple[str, ...]) -> baked.BakedQuery:
         """
-        Updates a user object
+        Returns the cached query of the users matching the values of the
+        columns `keys`, passed as parameters of the same names
         """
-        user_obj = self.find_user_by(id=user_id)
+        columns = User.__table__.columns
+        for key in keys:
+            if key not in columns:
+                raise InvalidRequestError(
+                    'Entity namespace for "users" has no property '
+                    '"{}"'.format(key))
 
-        try:
-            for col_name, value in kwargs.items():
-                setattr(user_obj, col_name, value)
-        except InvalidRequestError:
+        baked_query = self._bakery(lambda session: session.query(User))
+        for key in keys:
+            # `key` is part of the cache key of the query
+            baked_query.add_criteria(
+                lambda query, key=key: query.filter(
+                    columns[key] == bindparam(key)), key)
+        return baked_query
+
+    def add_session(self, session_id: str,
+                    expires_at: Union[datetime, None] = None,
+                    **kwargs: Mapping) -> bool:
+        """
+        Adds a new session to the storage, for the user matching the
+        key-value args, in a single `INSERT ... SELECT` statement.
+        Returns False if no user matched
+        """
+        users = self._filter_users(kwargs)
+        sessions = UserSession.__table__
+        query = select([literal(session_id), User.id,
+                        literal(datetime.utcnow()),
+                        literal(expires_at, type_=sessions.c.expires_at.type)
+                        ]).where(users).limit(1)
+        result = self._session.execute(sessions.insert().from_select(
+            ['session_id', 'user_id', 'created_at', 'expires_at'], query))
+        self._session.commit()
+
+        return result.rowcount > 0
+
+    def find_session(self, session_id: str) -> TypeVar('UserSession'):
+        """
+        finds a session by its id, with a single primary key read.
+        Its user is only loaded when `user` is accessed
+        """
+        user_session = self._bakery(
+            lambda session: session.query(UserSession))(
+                self._session).get(session_id)
+        if user_session is None:
+            raise NoResultFound
+        return user_session
+
+    def remove_sessions(self, user_id: int,
+                        session_id: Union[str, None] = None) -> int:
+        """
+        Removes the session `session_id` of a user, or all its sessions.
+        Returns the number of removed sessions
+        """
+        query = self._session.query(UserSession).filter(
+            UserSession.user_id == user_id)
+        if session_id is not None:
+            query = query.filter(UserSession.session_id == session_id)
+        removed = query.delete(synchronize_session='evaluate')
+        self._session.commit()
+        return removed
+
+    def update_user(self, user_id: int, **kwargs: Mapping) -> bool:
+        """
+        Updates a user object.
+        Returns False if no user has the id `user_id`
+        """
+        return self.update_user_by({"id": user_id}, **kwargs)
+
+    def update_user_by(self, criteria: Mapping, **kwargs: Mapping) -> bool:
+        """
+        Updates the users matching the key-value `criteria` in a single
+        `UPDATE ... WHERE` statement, at least one column is required.
+        Returns False if no user matched
+        """
+        users = self._filter_users(criteria)
+        if len(kwargs) == 0:
             raise ValueError
+        for col_name in kwargs:
+            if col_name not in columns_of(User):
+                raise ValueError
+
+        matched = self._session.query(User).filter(users).update(
+            kwargs, synchronize_session='evaluate')
         self._session.commit()
-        return None
+        return matched > 0
+
+    @staticmethod
+    def _filter_users(criteria: Mapping) -> TypeVar('ClauseElement'):
+        """
+        Returns the condition matching the users with the key-value
+        `criteria`
+        """
+        if len(criteria) == 0:
+            raise ValueError
+        conditions = []
+        for col_name, value in criteria.items():
+            if col_name not in columns_of(User):
+                raise ValueError
+            conditions.append(getattr(User, col_name) == value)
+        return and_(*conditions)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Hashing module: bcrypt runs on a bounded pool of worker threads (bcrypt
+releases the GIL), so a burst of logins doesn't hold every request thread.
+At most `HASH_WORKERS` hashes run at once and `HASH_QUEUE_SIZE` wait, other
+requests are refused with `HashingBusyError`; a caller waits at most
+`HASH_TIMEOUT` seconds for its hash.
+
+New hashes use the cost `BCRYPT_ROUNDS`, or with `BCRYPT_ROUNDS=auto` the
+highest cost whose hash takes at most `BCRYPT_TARGET_MS` on this machine,
+and at least `BCRYPT_MIN_ROUNDS`. The first process to calibrate stores the
+cost in `BCRYPT_ROUNDS_FILE`, the other workers read it from there, so they
+all hash with the same cost
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Union
+
+
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', str(os.cpu_count() or 2)))
+HASH_QUEUE_SIZE = int(os.getenv('HASH_QUEUE_SIZE', '16'))
+HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', '5'))
+# cost factor of the new hashes (bcrypt's default: 12), or `auto`
+BCRYPT_ROUNDS = os.getenv('BCRYPT_ROUNDS', '12')
+BCRYPT_TARGET_MS = float(os.getenv('BCRYPT_TARGET_MS', '250'))
+# lowest cost calibrated by `auto`, and the file of the calibrated cost
+BCRYPT_MIN_ROUNDS = int(os.getenv('BCRYPT_MIN_ROUNDS', '10'))
+BCRYPT_ROUNDS_FILE = os.getenv('BCRYPT_ROUNDS_FILE', 'bcrypt_rounds')
+# bounds of the bcrypt cost factor
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+# `$2b$12$...`: version, cost, then salt and hash
+_HASH_RE = re.compile(rb'^\$2[abxy]?\$(\d{2})\$')
+
+
+class HashingBusyError(Exception):
+    """
+    Raised when all the workers are busy and the queue is full
+    """
+
+
+class HashingTimeoutError(Exception):
+    """
+    Raised when a hash is not computed in time
+    """
+
+
+class HashingPool:
+    """
+    Bounded pool of bcrypt workers
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS,
+                 queue_size: int = HASH_QUEUE_SIZE,
+                 timeout: float = HASH_TIMEOUT):
+        """Instantiation method"""
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='bcrypt')
+        # a slot by running or waiting hash
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        runs `fn(*args)` on a worker and returns its result
+        """
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusyError
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # dropped if it didn't start yet
+            future.cancel()
+            raise HashingTimeoutError
+
+    def hashpw(self, password: bytes, salt: bytes) -> bytes:
+        """
+        returns the bcrypt hash of a password
+        """
+        return self.run(bcrypt.hashpw, password, salt)
+
+    def checkpw(self, password: bytes, hashed_password: bytes) -> bool:
+        """
+        checks a password against its bcrypt hash
+        """
+        return self.run(bcrypt.checkpw, password, hashed_password)
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def hashing_pool() -> HashingPool:
+    """
+    returns the pool of the process, created on first use
+    """
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = HashingPool()
+    return _POOL
+
+
+def calibrate_rounds(target_ms: float = BCRYPT_TARGET_MS,
+                     max_rounds: int = MAX_ROUNDS) -> int:
+    """
+    returns the highest bcrypt cost whose hash takes at most `target_ms`
+    milliseconds on this machine (each cost doubles the time)
+    """
+    rounds = MIN_ROUNDS
+    while rounds < max_rounds:
+        start = time.perf_counter()
+        bcrypt.hashpw(b'calibration', bcrypt.gensalt(rounds + 1))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > target_ms:
+            break
+        rounds += 1
+    return rounds
+
+
+def _read_rounds(path: str) -> Union[int, None]:
+    """
+    returns the cost stored in `path`, None if there is none
+    """
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def shared_rounds(path: str = BCRYPT_ROUNDS_FILE,
+                  min_rounds: int = BCRYPT_MIN_ROUNDS) -> int:
+    """
+    returns the calibrated cost stored in `path`, at least `min_rounds`.
+    If there is none, the cost is calibrated and stored, unless another
+    process stored its own first: then that one is used
+    """
+    min_rounds = min(max(min_rounds, MIN_ROUNDS), MAX_ROUNDS)
+    rounds = _read_rounds(path)
+    if rounds is None:
+        rounds = max(calibrate_rounds(), min_rounds)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('{:d}\n'.format(rounds))
+            # the file is complete when it appears, and only the first
+            # process creates it
+            os.link(tmp_path, path)
+        except FileExistsError:
+            rounds = _read_rounds(path) or rounds
+        finally:
+            os.unlink(tmp_path)
+    return min(max(rounds, min_rounds), MAX_ROUNDS)
+
+
+_ROUNDS = None
+
+
+def bcrypt_rounds() -> int:
+    """
+    returns the cost of the new hashes: `BCRYPT_ROUNDS`, or the shared
+    calibrated cost if `auto`
+    """
+    global _ROUNDS
+    if _ROUNDS is None:
+        with _POOL_LOCK:
+            if _ROUNDS is None:
+                if BCRYPT_ROUNDS == 'auto':
+                    _ROUNDS = shared_rounds()
+                else:
+                    _ROUNDS = min(max(int(BCRYPT_ROUNDS), MIN_ROUNDS),
+                                  MAX_ROUNDS)
+    return _ROUNDS
+
+
+def hash_rounds(hashed_password: bytes) -> Union[int, None]:
+    """
+    returns the cost of a bcrypt hash, None if it isn't one
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    match = _HASH_RE.match(hashed_password)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    returns True if a hash doesn't use the current cost. With `auto`, only
+    a lower cost is replaced: a higher one may come from another machine
+    or an earlier calibration, and is kept
+    """
+    rounds = hash_rounds(hashed_password)
+    if rounds is None:
+        return True
+    if BCRYPT_ROUNDS == 'auto':
+        return rounds < bcrypt_rounds()
+    return rounds != bcrypt_rounds()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the user lookups on a large `users` table: a table without
+indexes is filled, then opened by `DB`, which creates the missing indexes.
+Prints the time of an email lookup in SQLite before and after the indexes,
+the time to create them, and the time per call of `DB.find_user_by`
+against a plain `filter_by` query.
+
+Usage: ./lookup_benchmark.py [number of users (default 1000000)]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+
+def per_call(fn: Callable, args: List, repeat: int = 3) -> float:
+    """
+    returns the best average time of `fn(arg)` over `args`, in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            fn(arg)
+        elapsed = (time.perf_counter() - start) / len(args)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def fill(db_path: str, count: int) -> None:
+    """
+    creates the `users` table without its indexes (as before the
+    migration) and inserts `count` users
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE users (
+            id INTEGER NOT NULL PRIMARY KEY,
+            email VARCHAR(250) NOT NULL,
+            hashed_password VARCHAR(250) NOT NULL,
+            session_id VARCHAR(250),
+            reset_token VARCHAR(250)
+        )""")
+    conn.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, NULL, NULL)",
+        ((i, 'user{}@example.com'.format(i), 'x' * 60)
+         for i in range(1, count + 1)))
+    conn.commit()
+    conn.close()
+
+
+def main(count: int) -> None:
+    """
+    prints the lookup times on a table of `count` users
+    """
+    db_path = os.path.join(tempfile.mkdtemp(), 'lookup.db')
+    start = time.perf_counter()
+    fill(db_path, count)
+    print("{:d} users inserted in {:.1f}s".format(
+        count, time.perf_counter() - start))
+
+    rand = random.Random(0)
+    ids = [rand.randint(1, count) for _ in range(200)]
+    emails = ['user{}@example.com'.format(i) for i in ids]
+    query = "SELECT id FROM users WHERE email = ?"
+
+    conn = sqlite3.connect(db_path)
+    scan = per_call(lambda email: conn.execute(query, (email,)).fetchone(),
+                    emails[:10], repeat=1)
+    conn.close()
+
+    # `DB` reads its configuration when imported
+    os.environ['DB_URL'] = 'sqlite:///{}'.format(db_path)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from db import DB
+    from user import User
+
+    start = time.perf_counter()
+    db = DB()
+    migration = time.perf_counter() - start
+
+    conn = sqlite3.connect(db_path)
+    indexed = per_call(
+        lambda email: conn.execute(query, (email,)).fetchone(), emails)
+    conn.close()
+
+    session = db._session
+
+    def fresh(fn: Callable) -> Callable:
+        """ `fn` with an empty identity map """
+        def call(arg):
+            session.expunge_all()
+            return fn(arg)
+        return call
+
+    timings = [
+        ("email, SQLite without index", scan),
+        ("email, SQLite with index", indexed),
+        ("find_user_by(email=...), filter_by", per_call(fresh(
+            lambda email: session.query(User).filter_by(
+                email=email).first()), emails)),
+        ("find_user_by(email=...), baked", per_call(fresh(
+            lambda email: db.find_user_by(email=email)), emails)),
+        ("find_user_by(id=...), filter_by", per_call(fresh(
+            lambda user_id: session.query(User).filter_by(
+                id=user_id).first()), ids)),
+        ("find_user_by(id=...), baked get", per_call(fresh(
+            lambda user_id: db.find_user_by(id=user_id)), ids)),
+    ]
+    # the identity map of the session only keeps the users referenced
+    loaded = [db.find_user_by(id=user_id) for user_id in ids]
+    timings.append(("find_user_by(id=...), identity map", per_call(
+        lambda user_id: db.find_user_by(id=user_id), ids)))
+
+    print("indexes created on the existing table in {:.1f}s".format(
+        migration))
+    for name, seconds in timings:
+        print("{:<38} {:>10.3f}ms".format(name, seconds * 1000))
+    del loaded
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+UserSession module
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
+
+from user import Base
+
+
+class UserSession(Base):
+    """
+    UserSession class: a login session of a user, a user can have several
+    """
+    __tablename__ = 'sessions'
+
+    session_id = Column(String(250), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False,
+                     index=True)
+    created_at = Column(DateTime, nullable=False)
+    # None: the session never expires
+    expires_at = Column(DateTime)
+    # loaded on first access only
+    user = relationship('User', lazy='select')